@@ -1,6 +1,6 @@
 from django.contrib import admin
 from .models import User, Company, CompanyReview, Saved, CompanyQuestion, CompanyAnswer, Resume, WorkExperience, \
-    AcademicExperience, Language, Opportunity, Application
+    AcademicExperience, Language, Opportunity, Application, Job
 
 admin.site.register(User)
 admin.site.register(Company)
@@ -13,4 +13,5 @@ admin.site.register(CompanyAnswer)
 admin.site.register(Resume)
 admin.site.register(WorkExperience)
 admin.site.register(AcademicExperience)
-admin.site.register(Language)
\ No newline at end of file
+admin.site.register(Language)
+admin.site.register(Job)
\ No newline at end of file
@@ -0,0 +1,85 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import User
+
+
+# JWT authentication without a User query per request. The user id comes from the validated access token, the
+# User row is only loaded when a view needs more than the id, and then from a short-lived cache
+# (AUTH_USER_CACHE_TIMEOUT seconds) that is cleared whenever the user is saved. Only the writing worker's cache is
+# cleared, so the cache is off unless it's shared (see settings).
+
+def user_key(user_id):
+    return f"auth-user:{user_id}"
+
+
+def get_cached_user(user_id):
+    if not settings.AUTH_USER_CACHE_TIMEOUT:
+        return User.objects.filter(id=user_id).first()
+    key = user_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = User.objects.filter(id=user_id).first()
+        if user is not None:
+            cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+    return user
+
+
+class ClaimsUser:
+    """
+    The authenticated user as far as the access token tells: id/pk are free, any other attribute loads the
+    User through get_cached_user. As with any JWT, a deactivated user keeps id-only access until the token expires.
+    """
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, token):
+        self.token = token
+        self.id = self.pk = token[api_settings.USER_ID_CLAIM]
+
+    @cached_property
+    def user(self):
+        user = get_cached_user(self.id)
+        if user is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        return user
+
+    def __getattr__(self, name):
+        if 'id' not in self.__dict__:
+            raise AttributeError(name)
+        return getattr(self.user, name)
+
+    def __eq__(self, other):
+        return isinstance(other, (ClaimsUser, User)) and self.pk == other.pk
+
+    def __hash__(self):
+        return hash(self.pk)
+
+    def __str__(self):
+        return str(self.user)
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+        return ClaimsUser(validated_token)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    # After commit, so a concurrent lookup can't cache the row as it was before the change
+    userId = instance.id
+    transaction.on_commit(lambda: cache.delete(user_key(userId)))
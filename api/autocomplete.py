@@ -0,0 +1,243 @@
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import Counter
+
+from django.db import connection, connections, router, transaction
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Company
+
+
+# Company name autocomplete. PostgreSQL answers from a pg_trgm GIN index (migration 0004), other backends from
+# an in-process index that is updated in place after Company writes. Workers only see their own writes, so the
+# local index is also rebuilt in the background once it is older than MAX_AGE seconds, and swapped in when done.
+# Typos are matched per word, so a misspelled word anywhere in a longer name still finds it.
+
+MAX_AGE = 60
+MIN_SIMILARITY = 0.3
+# pg_trgm.word_similarity_threshold, its default 0.6 misses most single typos in short words
+WORD_SIMILARITY = 0.5
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b):
+    # Optimal string alignment distance: insertions, deletions, substitutions and adjacent transpositions
+    previous, current = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+    return current[-1]
+
+
+def word_similarity(queryWord, queryGrams, word, shared):
+    # 1 for a prefix (the word being typed), else the better of trigram similarity and, for words long enough not
+    # to match everything, a score for being a typo or two away from the word or its prefix of the same length
+    if word.startswith(queryWord):
+        return 1.0
+    similarity = shared / (len(queryGrams) + len(trigrams(word)) - shared)
+    allowed = len(queryWord) // 4
+    if allowed and len(word) >= len(queryWord) - allowed:
+        distance = min(edit_distance(queryWord, word[:len(queryWord)]),
+            edit_distance(queryWord, word) if abs(len(word) - len(queryWord)) <= allowed else allowed + 1)
+        if distance <= allowed:
+            similarity = max(similarity, 1 - distance / len(queryWord))
+    return similarity
+
+
+class NameEntries:
+    def __init__(self):
+        self.names, self.words = [], []
+        self.lowered, self.wordCompanies, self.wordGrams = {}, {}, {}
+
+    @classmethod
+    def load(cls):
+        entries = cls()
+        for companyId, name in Company.objects.values_list('id', 'name').iterator(chunk_size=2000):
+            lowered = name.lower()
+            entries.lowered[companyId] = lowered
+            entries.names.append((lowered, companyId))
+            for word in set(lowered.split()):
+                entries.words.append((word, companyId))
+                entries.add_word(word, companyId)
+        entries.names.sort()
+        entries.words.sort()
+        return entries
+
+    def add_word(self, word, companyId):
+        if word not in self.wordCompanies:
+            self.wordCompanies[word] = set()
+            for gram in trigrams(word):
+                self.wordGrams.setdefault(gram, set()).add(word)
+        self.wordCompanies[word].add(companyId)
+
+    def add(self, companyId, name):
+        lowered = self.lowered[companyId] = name.lower()
+        insort(self.names, (lowered, companyId))
+        for word in set(lowered.split()):
+            insort(self.words, (word, companyId))
+            self.add_word(word, companyId)
+
+    def remove(self, companyId):
+        lowered = self.lowered.pop(companyId, None)
+        if lowered is None:
+            return
+        del self.names[bisect_left(self.names, (lowered, companyId))]
+        for word in set(lowered.split()):
+            del self.words[bisect_left(self.words, (word, companyId))]
+            companies = self.wordCompanies[word]
+            companies.discard(companyId)
+            if not companies:
+                del self.wordCompanies[word]
+                for gram in trigrams(word):
+                    self.wordGrams[gram].discard(word)
+
+    @staticmethod
+    def prefix_matches(entries, prefix, limit):
+        matches = []
+        position = bisect_left(entries, (prefix,))
+        while position < len(entries) and len(matches) < limit and entries[position][0].startswith(prefix):
+            matches.append(entries[position][1])
+            position += 1
+        return matches
+
+    def similar_words(self, queryWord):
+        # Words sharing a trigram with the query word and similar enough to it
+        queryGrams = trigrams(queryWord)
+        shared = Counter()
+        for gram in queryGrams:
+            shared.update(self.wordGrams.get(gram, ()))
+        for word, count in shared.items():
+            similarity = word_similarity(queryWord, queryGrams, word, count)
+            if similarity >= MIN_SIMILARITY:
+                yield word, similarity
+
+    def lookup(self, text, limit):
+        # Ranked: whole name prefix > word prefix > per word similarity (typos)
+        scores = {}
+        for companyId in self.prefix_matches(self.names, text, limit):
+            scores[companyId] = 3.0
+        if len(scores) < limit:
+            for companyId in self.prefix_matches(self.words, text, limit * 2):
+                scores.setdefault(companyId, 2.0)
+        queryWords = text.split()
+        if len(scores) < limit and queryWords:
+            # Each query word scores its best match among the name's words, the name scores their average
+            best = {}
+            for position, queryWord in enumerate(queryWords):
+                for word, similarity in self.similar_words(queryWord):
+                    for companyId in self.wordCompanies[word]:
+                        wordScores = best.setdefault(companyId, [0.0] * len(queryWords))
+                        wordScores[position] = max(wordScores[position], similarity)
+            for companyId, wordScores in best.items():
+                similarity = sum(wordScores) / len(queryWords)
+                if similarity >= MIN_SIMILARITY:
+                    scores.setdefault(companyId, similarity)
+        return sorted(scores.items(), key=lambda item: -item[1])[:limit]
+
+
+class CompanyNameIndex:
+    def __init__(self):
+        # lock guards the entries and the changes made while a rebuild reads the table
+        self.lock = threading.Lock()
+        self.firstBuild = threading.Lock()
+        self.entries = None
+        self.builtAt = None
+        self.changes = None
+
+    def update(self, companyId, name):
+        # name is None for a deleted company
+        with self.lock:
+            if self.entries is not None:
+                self.entries.remove(companyId)
+                if name is not None:
+                    self.entries.add(companyId, name)
+            if self.changes is not None:
+                self.changes.append((companyId, name))
+
+    def rebuild(self):
+        with self.lock:
+            if self.changes is not None:
+                return
+            self.changes = []
+        try:
+            entries = NameEntries.load()
+        except Exception:
+            with self.lock:
+                self.changes = None
+            raise
+        with self.lock:
+            # Writes committed while loading may be missing from it
+            for companyId, name in self.changes:
+                entries.remove(companyId)
+                if name is not None:
+                    entries.add(companyId, name)
+            self.entries, self.builtAt, self.changes = entries, time.monotonic(), None
+
+    def rebuild_in_background(self):
+        try:
+            self.rebuild()
+        finally:
+            connection.close()
+
+    def ensure_built(self):
+        if self.entries is None:
+            with self.firstBuild:
+                if self.entries is None:
+                    self.rebuild()
+        elif time.monotonic() - self.builtAt > MAX_AGE and self.changes is None:
+            # Lookups keep using the current entries meanwhile
+            threading.Thread(target=self.rebuild_in_background, daemon=True).start()
+
+    def lookup(self, text, limit):
+        self.ensure_built()
+        text = text.lower().strip()
+        with self.lock:
+            return self.entries.lookup(text, limit)
+
+
+company_name_index = CompanyNameIndex()
+
+
+@receiver(post_save, sender=Company)
+def update_company_name_index(sender, instance, **kwargs):
+    companyId, name = instance.id, instance.name
+    transaction.on_commit(lambda: company_name_index.update(companyId, name))
+
+
+@receiver(post_delete, sender=Company)
+def remove_from_company_name_index(sender, instance, **kwargs):
+    companyId = instance.id
+    transaction.on_commit(lambda: company_name_index.update(companyId, None))
+
+
+def autocomplete_companies(text, limit):
+    if connection.vendor == 'postgresql':
+        prefix = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        database = router.db_for_read(Company)
+        # Both conditions are served by the gin_trgm_ops index on api_company.name. <% compares the text with the
+        # most similar run of words in the name, not the whole name
+        with transaction.atomic(using=database):
+            with connections[database].cursor() as cursor:
+                cursor.execute("SELECT set_config('pg_trgm.word_similarity_threshold', %s, true)",
+                    [str(WORD_SIMILARITY)])
+            return list(Company.objects.using(database)
+                .filter(RawSQL("api_company.name ILIKE %s OR %s <%% api_company.name", [prefix, text],
+                    output_field=BooleanField()))
+                .annotate(rank=RawSQL("CASE WHEN api_company.name ILIKE %s THEN 1 ELSE 0 END + "
+                    "word_similarity(%s, api_company.name)", [prefix, text], output_field=FloatField()))
+                .order_by('-rank', 'name')[:limit])
+
+    ranked = company_name_index.lookup(text, limit)
+    companies = Company.objects.in_bulk([companyId for companyId, score in ranked])
+    return [companies[companyId] for companyId, score in ranked if companyId in companies]
@@ -0,0 +1,206 @@
+import time
+from hashlib import md5
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from .models import Application, CacheVersion, Company, CompanyAnswer, CompanyQuestion, CompanyReview, Opportunity, \
+    Saved
+from .replicas import read_from_primary
+
+
+# Response cache for public read endpoints. Entries are keyed by path, query string and the current version of
+# every model/object the response depends on, and writes bump those versions instead of deleting entries, so
+# invalidation is exact and never scans keys. Versions live in the database (CacheVersion), so they are the same
+# for every worker and node whatever the cache backend. The backend is CACHES[RESPONSE_CACHE_ALIAS], caching is
+# off by default unless it is shared (see CACHE_SHARED): per-process copies in every worker rarely get hits.
+# The same versions (and the time they were last bumped) back ETag/Last-Modified validators for conditional GETs.
+
+def response_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def get_versions(names):
+    # Versions in the order of names (0 if never bumped) and the time of the latest bump, read from the primary
+    # since a replica can lag behind a bump
+    rows = {name: (version, modified) for name, version, modified in CacheVersion.objects.using(DEFAULT_DB_ALIAS)
+        .filter(name__in = names).values_list('name', 'version', 'modified')}
+    modified = [modified for version, modified in rows.values()]
+    lastModified = int(max(modified).timestamp()) if modified else None
+    return [rows[name][0] if name in rows else 0 for name in names], lastModified
+
+
+def read_from_primary_if_recent(lastModified):
+    # A replica may not have the write behind a version bumped moments ago, don't tag or cache its data with it
+    if lastModified and time.time() - lastModified < settings.REPLICA_PIN_SECONDS:
+        read_from_primary()
+
+
+def bump_versions(*names):
+    now = timezone.now()
+    for name in names:
+        if CacheVersion.objects.filter(name = name).update(version = F('version') + 1, modified = now):
+            continue
+        try:
+            with transaction.atomic():
+                # Start at the current time rather than 1, so a version table that was reset can't reuse versions
+                # of entries still in the cache
+                CacheVersion.objects.create(name = name, version = int(now.timestamp() * 1000), modified = now)
+        except IntegrityError:
+            CacheVersion.objects.filter(name = name).update(version = F('version') + 1, modified = now)
+
+
+def bump_versions_on_commit(*names):
+    # After commit, so a concurrent read can't cache pre-commit data under the new version
+    transaction.on_commit(lambda: bump_versions(*names))
+
+
+def count(view, outcome):
+    cache = response_cache()
+    key = f"stats:{view}:{outcome}"
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 1, timeout=None)
+
+
+def cache_stats(views):
+    cache = response_cache()
+    keys = [f"stats:{view}:{outcome}" for view in views for outcome in ('hits', 'misses')]
+    values = cache.get_many(keys)
+    return {view: {outcome: values.get(f"stats:{view}:{outcome}", 0) for outcome in ('hits', 'misses')}
+        for view in views}
+
+
+def request_signature(request):
+    query = urlencode(sorted(request.query_params.lists()), doseq=True)
+    return f"{request.path}?{query}"
+
+
+class VersionedViewMixin:
+    """
+    Views list the versions their response depends on in cache_versions, e.g. 'company' for any company write or
+    'company:{company_id}' (formatted with the URL kwargs) for writes to one company and its reviews.
+    """
+    cache_versions = ()
+
+    def get_cache_versions(self):
+        return [name.format(**self.kwargs) for name in self.cache_versions]
+
+    def get_current_versions(self):
+        # Read once per request, for both mixins
+        if not hasattr(self, 'currentVersions'):
+            versions, lastModified = get_versions(self.get_cache_versions())
+            self.currentVersions = ('.'.join(str(version) for version in versions), lastModified)
+        return self.currentVersions
+
+
+class ConditionalGetMixin(VersionedViewMixin):
+    """
+    Answers GETs with ETag/Last-Modified validators derived from the view's versions, a matching
+    If-None-Match/If-Modified-Since returns 304 before the queryset or serializer run.
+    """
+
+    def get(self, request, *args, **kwargs):
+        versions, lastModified = self.get_current_versions()
+        # Authenticated responses may differ per user
+        signature = f"{request_signature(request)}:{request.user.id}:{versions}"
+        etag = f'"{md5(signature.encode()).hexdigest()}"'
+
+        response = get_conditional_response(request, etag=etag, last_modified=lastModified)
+        if response is None:
+            read_from_primary_if_recent(lastModified)
+            response = super().get(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        if lastModified:
+            response['Last-Modified'] = http_date(lastModified)
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+
+class CachedResponseMixin(VersionedViewMixin):
+    """
+    Caches anonymous GET responses under the view's versions.
+    """
+
+    def get(self, request, *args, **kwargs):
+        if request.user.is_authenticated or not settings.RESPONSE_CACHE_TIMEOUT:
+            return super().get(request, *args, **kwargs)
+
+        versions, lastModified = self.get_current_versions()
+        key = "response:" + md5(request_signature(request).encode()).hexdigest() + f":{versions}"
+
+        cache = response_cache()
+        data = cache.get(key)
+        viewName = type(self).__name__
+        if data is not None:
+            count(viewName, 'hits')
+            return Response(data)
+
+        count(viewName, 'misses')
+        read_from_primary_if_recent(lastModified)
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+        return response
+
+
+@receiver(post_save, sender=Company)
+@receiver(post_delete, sender=Company)
+def company_changed(sender, instance, **kwargs):
+    bump_versions_on_commit('company', f"company:{instance.id}")
+
+
+@receiver(post_save, sender=CompanyReview)
+@receiver(post_delete, sender=CompanyReview)
+def company_review_changed(sender, instance, **kwargs):
+    # Reviews also change the company's stored review totals
+    bump_versions_on_commit('companyreview', f"company:{instance.company_id}")
+
+
+@receiver(post_save, sender=Opportunity)
+@receiver(post_delete, sender=Opportunity)
+@receiver(post_save, sender=Application)
+@receiver(post_delete, sender=Application)
+def opportunity_changed(sender, instance, **kwargs):
+    # Applications change the opportunity's applicant count
+    bump_versions_on_commit('opportunity')
+
+
+@receiver(post_save, sender=Saved)
+@receiver(post_delete, sender=Saved)
+@receiver(post_save, sender=Application)
+@receiver(post_delete, sender=Application)
+def user_flags_changed(sender, instance, **kwargs):
+    # The user's is_saved/has_applied flags on opportunity lists
+    if instance.user_id is not None:
+        bump_versions_on_commit(f"user:{instance.user_id}:flags")
+
+
+@receiver(post_save, sender=CompanyQuestion)
+@receiver(post_delete, sender=CompanyQuestion)
+def company_question_changed(sender, instance, **kwargs):
+    bump_versions_on_commit(f"company:{instance.company_id}:questions")
+
+
+@receiver(post_save, sender=CompanyAnswer)
+@receiver(post_delete, sender=CompanyAnswer)
+def company_answer_changed(sender, instance, **kwargs):
+    bump_versions_on_commit(f"question:{instance.company_question_id}:answers")
+    # Answers are embedded in the company page, gone if the question is being deleted (which bumps the questions)
+    companyId = CompanyQuestion.objects.filter(id = instance.company_question_id)\
+        .values_list('company_id', flat=True).first()
+    if companyId is not None:
+        bump_versions_on_commit(f"company:{companyId}:answers")
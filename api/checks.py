@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+
+@register()
+def shared_cache_check(app_configs, **kwargs):
+    # Idempotency keys are kept in the response cache, a per-process one only deduplicates retries that reach the
+    # same worker. Fine while developing on a single process
+    if settings.CACHE_SHARED or settings.DEBUG:
+        return []
+    return [Warning(
+        "The cache isn't shared between workers, Idempotency-Key retries reaching another worker are performed again.",
+        hint="Set CACHE_URL to a cache all workers use (e.g. memcached), or CACHE_SHARED=true if it is one.",
+        id='api.W001',
+    )]
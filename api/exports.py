@@ -0,0 +1,94 @@
+import csv
+import json
+
+from rest_framework.fields import DateTimeField
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import Application, Resume
+from .serializers import FullResumeSerializer, UserSerializer
+
+
+# Streaming exports of an opportunity's applications. Rows are read with iterator() (a server-side cursor on
+# PostgreSQL, unless DB_TRANSACTION_POOLER disables them) and resumes are fetched per batch, so memory stays
+# flat however many applications there are.
+
+BATCH_SIZE = 500
+USER_FIELDS = UserSerializer.Meta.fields
+RESUME_SECTIONS = ('work_experiences', 'academic_experiences', 'languages')
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def application_batches(opportunity, withResume):
+    applications = Application.objects.filter(opportunity = opportunity).select_related('user')\
+        .order_by('-timestamp', '-id').iterator(chunk_size=BATCH_SIZE)
+
+    batch = []
+    for application in applications:
+        batch.append(application)
+        if len(batch) == BATCH_SIZE:
+            yield batch, resumes_for(batch, withResume)
+            batch = []
+    if batch:
+        yield batch, resumes_for(batch, withResume)
+
+
+def resumes_for(applications, withResume):
+    if not withResume:
+        return {}
+    resumeIds = {application.resume_id for application in applications if application.resume_id}
+    return Resume.objects.with_sections().in_bulk(resumeIds)
+
+
+def questions_of(opportunity):
+    return [getattr(opportunity, f"question_{i}") for i in range(1, 6)]
+
+
+def user_data(user):
+    return UserSerializer(user).data if user else dict.fromkeys(USER_FIELDS)
+
+
+def stream_ndjson(opportunity, withResume):
+    questions = questions_of(opportunity)
+    for applications, resumes in application_batches(opportunity, withResume):
+        for application in applications:
+            row = {
+                'id': application.id,
+                'timestamp': application.timestamp,
+                'user': user_data(application.user),
+                'answers': [{'question': question, 'answer': getattr(application, f"answer_{i}")}
+                    for i, question in enumerate(questions, start=1)],
+            }
+            if withResume:
+                resume = resumes.get(application.resume_id)
+                row['resume'] = FullResumeSerializer(resume).data if resume else None
+            yield json.dumps(row, cls=JSONEncoder) + '\n'
+
+
+def stream_csv(opportunity, withResume):
+    writer = csv.writer(Echo())
+    timestampField = DateTimeField()
+    questions = questions_of(opportunity)
+    header = ['id', 'timestamp'] + [f"user_{field}" for field in USER_FIELDS] + \
+        [question or f"answer_{i}" for i, question in enumerate(questions, start=1)]
+    if withResume:
+        header += ['resume_id', 'resume_name', 'resume_summary', 'resume_other'] + list(RESUME_SECTIONS)
+    yield writer.writerow(header)
+
+    for applications, resumes in application_batches(opportunity, withResume):
+        for application in applications:
+            user = user_data(application.user)
+            row = [application.id, timestampField.to_representation(application.timestamp)] + [user[field] for field in USER_FIELDS] + \
+                [getattr(application, f"answer_{i}") for i in range(1, 6)]
+            if withResume:
+                resume = resumes.get(application.resume_id)
+                if resume:
+                    data = FullResumeSerializer(resume).data
+                    row += [resume.id, resume.name, resume.summary, resume.other] + \
+                        [json.dumps(data[section], cls=JSONEncoder) for section in RESUME_SECTIONS]
+                else:
+                    row += [''] * (4 + len(RESUME_SECTIONS))
+            yield writer.writerow(row)
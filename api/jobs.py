@@ -0,0 +1,175 @@
+import json
+import logging
+import os
+import socket
+import traceback
+import uuid
+from datetime import timedelta
+from hashlib import md5
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Min
+from django.db.models.functions import Greatest, Least
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+
+# Background jobs, queued in the Job table and run by `manage.py run_jobs` workers, so no broker is needed. Jobs
+# are functions registered with @job and queued with function.enqueue(*arguments), in the caller's transaction:
+# a job queued by a write that rolls back is never run. Arguments must be JSON serializable.
+# - Higher priority first, then oldest run_at. Workers claim a batch at a time (SKIP LOCKED where supported)
+#   and run each job in its own transaction.
+# - A job queued while an identical one (same name and arguments, or the same key) is still pending is merged
+#   into it, keeping the higher priority and earlier run_at.
+# - Failed jobs are retried after JOB_RETRY_DELAY seconds, doubled per attempt, up to max_attempts. Jobs left
+#   running longer than JOB_TIMEOUT (a worker that died) count as a failed attempt.
+
+registry = {}
+
+
+def job(name=None, priority=0, max_attempts=3):
+    def register(function):
+        jobName = name or f"{function.__module__}.{function.__name__}"
+        registry[jobName] = function
+        function.enqueue = lambda *arguments, **options: enqueue(jobName, arguments, **{
+            'priority': priority, 'max_attempts': max_attempts, **options})
+        return function
+    return register
+
+
+def job_key(name, arguments):
+    return f"{name}:{md5(json.dumps(arguments, sort_keys=True).encode()).hexdigest()}"
+
+
+def enqueue(name, arguments=(), priority=0, max_attempts=3, delay=0, key=None):
+    arguments = list(arguments)
+    key = key or job_key(name, arguments)
+    runAt = timezone.now() + timedelta(seconds=delay)
+    try:
+        with transaction.atomic():
+            return Job.objects.create(name=name, arguments=arguments, key=key, priority=priority,
+                max_attempts=max_attempts, run_at=runAt)
+    except IntegrityError:
+        Job.objects.filter(key=key, status=Job.PENDING)\
+            .update(priority=Greatest('priority', priority), run_at=Least('run_at', runAt))
+        return Job.objects.filter(key=key, status=Job.PENDING).first()
+
+
+def new_claim():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def claim(batchSize):
+    # Marks up to batchSize ready jobs as running under a new claim and returns them in run order. A single UPDATE
+    # of a subquery, so SQLite takes the write lock at once instead of upgrading a read lock (which fails when
+    # another worker holds one) and PostgreSQL skips rows other workers are claiming
+    claimId = new_claim()
+    now = timezone.now()
+    order = ('-priority', 'run_at', 'id')
+    ready = Job.objects.filter(status=Job.PENDING, run_at__lte=now).order_by(*order)
+    if connection.features.has_select_for_update_skip_locked:
+        ready = ready.select_for_update(skip_locked=True)
+    with transaction.atomic():
+        claimed = Job.objects.filter(id__in=ready.values('id')[:batchSize])\
+            .update(status=Job.RUNNING, worker=claimId, started_at=now, attempts=F('attempts') + 1)
+    if not claimed:
+        return []
+    return list(Job.objects.filter(status=Job.RUNNING, worker=claimId).order_by(*order))
+
+
+def finish(job, status, **fields):
+    # A job requeued as timed out may have been claimed again meanwhile, only the current claim may finish it
+    running = Job.objects.filter(id=job.id, status=Job.RUNNING, worker=job.worker)
+    try:
+        with transaction.atomic():
+            running.update(status=status, **fields)
+    except IntegrityError:
+        # Going back to pending while an identical job was queued, which will do the work
+        running.update(status=Job.FAILED, finished_at=timezone.now(),
+            error=fields.get('error', '') + "Not retried, an identical job is pending\n")
+
+
+def retry(job, error):
+    if job.attempts < job.max_attempts:
+        delay = settings.JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+        finish(job, Job.PENDING, run_at=timezone.now() + timedelta(seconds=delay), error=error)
+    else:
+        finish(job, Job.FAILED, finished_at=timezone.now(), error=error)
+
+
+def run(job):
+    function = registry.get(job.name)
+    try:
+        if function is None:
+            raise LookupError(f"No job registered as {job.name}")
+        with transaction.atomic():
+            function(*job.arguments)
+    except Exception:
+        logger.exception("Job #%d %s failed (attempt %d of %d)", job.id, job.name, job.attempts, job.max_attempts)
+        retry(job, traceback.format_exc())
+        return False
+    finish(job, Job.DONE, finished_at=timezone.now())
+    return True
+
+
+def release(jobs):
+    # Claimed jobs a stopping worker didn't start go back to the queue as they were
+    for job in jobs:
+        finish(job, Job.PENDING, attempts=F('attempts') - 1)
+
+
+def requeue_timed_out():
+    timedOut = list(Job.objects.filter(status=Job.RUNNING,
+        started_at__lt=timezone.now() - timedelta(seconds=settings.JOB_TIMEOUT)))
+    for job in timedOut:
+        logger.warning("Job #%d %s timed out on %s", job.id, job.name, job.worker)
+        retry(job, f"Timed out after {settings.JOB_TIMEOUT} seconds on {job.worker}\n")
+    return len(timedOut)
+
+
+def purge_finished():
+    # Failed jobs are kept for inspection
+    before = timezone.now() - timedelta(days=settings.JOB_RETENTION_DAYS)
+    return Job.objects.filter(status=Job.DONE, finished_at__lt=before).delete()[0]
+
+
+def queue_stats():
+    now = timezone.now()
+    statuses = {status: 0 for status, label in Job.STATUSES}
+    names = {}
+    for row in Job.objects.values('name', 'status').annotate(total=Count('*')).order_by():
+        statuses[row['status']] += row['total']
+        names.setdefault(row['name'], {status: 0 for status, label in Job.STATUSES})[row['status']] = row['total']
+    oldest = Job.objects.filter(status=Job.PENDING, run_at__lte=now).aggregate(oldest=Min('run_at'))['oldest']
+
+    # Wait is from queued (or due, for delayed jobs and retries) to started
+    recent = Job.objects.filter(status=Job.DONE, finished_at__gte=now - timedelta(hours=1))\
+        .values_list('timestamp', 'run_at', 'started_at', 'finished_at')
+    waits, runs = [], []
+    for queued, runAt, started, finished in recent:
+        waits.append((started - max(queued, runAt)).total_seconds())
+        runs.append((finished - started).total_seconds())
+    return {
+        'statuses': statuses,
+        'names': names,
+        'oldest_ready_seconds': round((now - oldest).total_seconds(), 3) if oldest else 0,
+        'last_hour': {
+            'done': len(runs),
+            'avg_wait_seconds': round(sum(waits) / len(waits), 3) if waits else None,
+            'max_wait_seconds': round(max(waits), 3) if waits else None,
+            'avg_run_seconds': round(sum(runs) / len(runs), 3) if runs else None,
+        },
+    }
+
+
+# Jobs
+
+@job(priority=-10)
+def recount_reviews():
+    call_command('recount_reviews', stdout=StringIO())
@@ -0,0 +1,80 @@
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+
+
+class Command(BaseCommand):
+    help = "Measure the per request cost of opening database connections against persistent and pooled connections"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help="Simulated requests per thread and mode")
+        parser.add_argument('--threads', type=int, default=1)
+        parser.add_argument('--pool-size', type=int, default=0, help="Also run pooled, with this pool size")
+
+    def handle(self, *args, **options):
+        settingsDict = connection.settings_dict
+        saved = {key: settingsDict.get(key) for key in ('CONN_MAX_AGE', 'POOL')}
+        modes = [
+            ('new connection per request', {'CONN_MAX_AGE': 0, 'POOL': None}),
+            ('persistent', {'CONN_MAX_AGE': None, 'POOL': None}),
+        ]
+        if options['pool_size']:
+            if not hasattr(connection, 'pool'):
+                self.stderr.write("Pooling needs the volunteer.db.postgresql engine, skipped")
+            else:
+                modes.append(('pooled', {'CONN_MAX_AGE': 0, 'POOL': {'SIZE': options['pool_size'], 'TIMEOUT': 30}}))
+
+        connects = []
+        countConnect = lambda sender, connection, **kwargs: connects.append(1)
+        connection_created.connect(countConnect)
+        try:
+            for name, overrides in modes:
+                connections.close_all()
+                settingsDict.update(overrides)
+                connects.clear()
+                latencies = self.run(options['requests'], options['threads'])
+                pool = getattr(connection, 'pool', None)
+                # Pooled connections send connection_created on every checkout, count real opens instead
+                opened = pool.stats()['opened'] if pool is not None else len(connects)
+                latencies.sort()
+                self.stdout.write(
+                    f"{name:28} {len(latencies) / sum(latencies):9.1f} req/s  "
+                    f"p50 {statistics.median(latencies) * 1000:7.3f} ms  "
+                    f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:7.3f} ms  "
+                    f"{opened:6} connections opened")
+                if pool is not None:
+                    pool.close_all()
+        finally:
+            connection_created.disconnect(countConnect)
+            connections.close_all()
+            settingsDict.update(saved)
+
+    def run(self, requests, threads):
+        latencies = []
+        lock = threading.Lock()
+
+        def worker():
+            own = []
+            for _ in range(requests):
+                start = time.perf_counter()
+                # The same connection handling as a real request: reuse, age and health checks run on these signals
+                request_started.send(sender=self.__class__)
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                request_finished.send(sender=self.__class__)
+                own.append(time.perf_counter() - start)
+            connections.close_all()
+            with lock:
+                latencies.extend(own)
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return latencies
@@ -0,0 +1,257 @@
+import json
+import time
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.management.commands.benchmark_http import percentile
+from api.models import AcademicExperience, Application, Company, CompanyAnswer, CompanyReview, Language, \
+    Opportunity, Saved, User, WorkExperience
+from api.urls import urlpatterns
+
+METRICS_TOKEN = 'benchmark'
+
+
+class Command(BaseCommand):
+    help = "Request every route in api/urls.py in-process against seeded data (see seed_data) and report throughput, " \
+        "latency percentiles and SQL queries per request. Writes are rolled back."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help="Timed requests per case")
+        parser.add_argument('--cold', action='store_true', help="Disable the response cache")
+        parser.add_argument('--output', help="Write the results to this JSON baseline file")
+        parser.add_argument('--compare', help="Fail if results regress against this JSON baseline file")
+        parser.add_argument('--tolerance', type=float, default=0.5,
+            help="Allowed relative p50 latency increase over the baseline, more queries always fail")
+
+    def fixtures(self):
+        opportunity = Opportunity.objects.for_listing().filter(is_active=True).order_by('-applicant_total').first()
+        application = opportunity and Application.objects.filter(opportunity=opportunity, resume__isnull=False) \
+            .select_related('resume').first()
+        if application is None:
+            raise CommandError("No seeded data found, run seed_data first")
+        resume = application.resume
+        company = Company.objects.order_by('-review_total_count').first()
+        answer = CompanyAnswer.objects.select_related('company_question').order_by('id').first()
+        saved = Saved.objects.order_by('id').first()
+        return SimpleNamespace(
+            opportunity=opportunity,
+            poster=opportunity.user_id,
+            application=application,
+            applicant=application.user_id,
+            resume=resume,
+            work=WorkExperience.objects.filter(resume=resume).first(),
+            academic=AcademicExperience.objects.filter(resume=resume).first(),
+            language=Language.objects.filter(resume=resume).first(),
+            # An active opportunity the applicant can still apply to and save
+            target=Opportunity.objects.filter(is_active=True).exclude(user_id=application.user_id)
+                .exclude(application_opportunity__user_id=application.user_id)
+                .exclude(saved_opportunity__user_id=application.user_id).first(),
+            company=company,
+            review=CompanyReview.objects.filter(company=company).first(),
+            question=answer.company_question,
+            answer=answer,
+            saved=saved,
+            staff=User.objects.filter(is_staff=True).values_list('id', flat=True).first(),
+        )
+
+    def cases(self, fx):
+        # (label, url name, url kwargs, method, user id (or an Authorization header) or None, data)
+        applicant, poster = fx.applicant, fx.poster
+        resume = {'resume_id': fx.resume.id}
+        recruiter = {'application_id': fx.application.id, 'resume_id': fx.resume.id}
+        return [
+            ('new user', 'new_user', {}, 'POST', None,
+                {'username': 'benchmark-user', 'email': 'benchmark@example.com', 'password': 'benchmark'}),
+            ('current user', 'current_user', {}, 'GET', applicant, None),
+            ('update user', 'user_update', {'user_id': applicant}, 'PATCH', applicant, {'location': 'Toronto'}),
+
+            ('opportunities anonymous', 'opportunities', {}, 'GET', None, None),
+            ('opportunities', 'opportunities', {}, 'GET', applicant, None),
+            ('create opportunity', 'opportunities', {}, 'POST', poster,
+                {'company': fx.company.id, 'position': 'Tutor', 'location': 'Toronto', 'description': '-', 'image_url': '-'}),
+            ('opportunity', 'single_opportunity', {'opportunity_id': fx.opportunity.id}, 'GET', applicant, None),
+            ('update opportunity', 'single_opportunity', {'opportunity_id': fx.opportunity.id}, 'PATCH', poster,
+                {'position': 'Tutor'}),
+            ('opportunity search', 'opportunity_search_results',
+                {'opportunity_position': 'tutor', 'opportunity_location': 'toronto'}, 'GET', None, None),
+
+            ('saved', 'saved_opportunities', {'user_id': fx.saved.user_id}, 'GET', fx.saved.user_id, None),
+            ('save opportunity', 'saved_opportunities', {'user_id': applicant}, 'POST', applicant,
+                {'user': applicant, 'opportunity': fx.target.id}),
+            ('saved opportunity', 'single_saved_opportunity',
+                {'user_id': fx.saved.user_id, 'opportunity_id': fx.saved.opportunity_id}, 'GET', fx.saved.user_id, None),
+            ('unsave opportunity', 'single_saved_opportunity',
+                {'user_id': fx.saved.user_id, 'opportunity_id': fx.saved.opportunity_id}, 'DELETE', fx.saved.user_id, None),
+            ('posted', 'opportunities_posted', {'user_id': poster}, 'GET', poster, None),
+            ('applied', 'opportunities_applied', {'user_id': applicant}, 'GET', applicant, None),
+            ('applied opportunity', 'single_applied_opportunity',
+                {'user_id': applicant, 'opportunity_id': fx.opportunity.id}, 'GET', applicant, None),
+
+            ('applications', 'applications', {'opportunity_id': fx.opportunity.id}, 'GET', poster, None),
+            ('apply', 'applications', {'opportunity_id': fx.target.id}, 'POST', applicant,
+                {'opportunity': fx.target.id, 'resume': fx.resume.id, 'answer_1': '-'}),
+            ('export csv', 'applications_export', {'opportunity_id': fx.opportunity.id, 'export_format': 'csv'},
+                'GET', poster, None),
+            ('export ndjson', 'applications_export', {'opportunity_id': fx.opportunity.id, 'export_format': 'ndjson'},
+                'GET', poster, None),
+            ('application', 'single_application', {'application_id': fx.application.id}, 'GET', poster, None),
+            ('withdraw application', 'single_application', {'application_id': fx.application.id}, 'DELETE',
+                applicant, None),
+
+            ('companies anonymous', 'companies', {}, 'GET', None, None),
+            ('company', 'single_company', {'company_id': fx.company.id}, 'GET', None, None),
+            ('company page', 'company_page', {'company_id': fx.company.id}, 'GET', None, None),
+            ('company search', 'company_search_results', {'company_name': 'hope'}, 'GET', None, None),
+            ('company autocomplete', 'company_autocomplete', {'company_name': 'gre'}, 'GET', None, None),
+
+            ('resumes', 'resume_list', {'user_id': applicant}, 'GET', applicant, None),
+            ('create resume', 'resume_list', {'user_id': applicant}, 'POST', applicant,
+                {'name': '-', 'summary': '-', 'other': '-'}),
+            ('resume', 'single_resume', resume, 'GET', applicant, None),
+            ('update resume', 'single_resume', resume, 'PATCH', applicant, {'name': '-'}),
+            ('work experiences', 'work_experiences', resume, 'GET', applicant, None),
+            ('add work experience', 'work_experiences', resume, 'POST', applicant,
+                {'resume': fx.resume.id, 'company': '-', 'position': '-', 'location': '-', 'industry': '-',
+                    'start_date': '2020-01-01', 'description': '-'}),
+            ('work experience', 'single_work_experience', dict(resume, work_experience_id=fx.work.id), 'GET',
+                applicant, None),
+            ('academic experiences', 'academic_experiences', resume, 'GET', applicant, None),
+            ('academic experience', 'single_academic_experience', dict(resume, academic_experience_id=fx.academic.id),
+                'GET', applicant, None),
+            ('languages', 'languages', resume, 'GET', applicant, None),
+            ('replace languages', 'languages', resume, 'PUT', applicant,
+                [{'name': 'English', 'level': 'Fluent'}, {'name': 'French', 'level': 'Basic'}]),
+            ('language', 'single_language', dict(resume, language_id=fx.language.id), 'GET', applicant, None),
+
+            ('recruiter resume', 'single_resume_recruiter', recruiter, 'GET', poster, None),
+            ('recruiter work experiences', 'work_experience_list_recruiter', recruiter, 'GET', poster, None),
+            ('recruiter academic experiences', 'academic_experience_list_recruiter', recruiter, 'GET', poster, None),
+            ('recruiter languages', 'language_list_recruiter', recruiter, 'GET', poster, None),
+            ('applicant resumes', 'applicant_resumes', {'opportunity_id': fx.opportunity.id}, 'GET', poster, None),
+
+            ('reviews anonymous', 'company_reviews', {'company_id': fx.company.id}, 'GET', None, None),
+            ('review', 'company_reviews', {'company_id': fx.company.id}, 'POST', applicant,
+                {'company': fx.company.id, 'identification': '-', 'score': '4.0', 'review': '-'}),
+            ('single review', 'single_company_review', {'company_id': fx.company.id, 'review_id': fx.review.id},
+                'GET', fx.review.user_id, None),
+            ('update review', 'single_company_review', {'company_id': fx.company.id, 'review_id': fx.review.id},
+                'PATCH', fx.review.user_id, {'score': '3.5'}),
+
+            ('questions', 'company_questions', {'company_id': fx.question.company_id}, 'GET', None, None),
+            ('ask question', 'company_questions', {'company_id': fx.question.company_id}, 'POST', applicant,
+                {'company': fx.question.company_id, 'question': '-'}),
+            ('question', 'single_company_question',
+                {'company_id': fx.question.company_id, 'question_id': fx.question.id}, 'GET', fx.question.user_id, None),
+            ('answers', 'company_answers', {'question_id': fx.question.id}, 'GET', None, None),
+            ('answer question', 'company_answers', {'question_id': fx.question.id}, 'POST', applicant,
+                {'company_question': fx.question.id, 'answer': '-'}),
+            ('answer', 'single_company_answer', {'question_id': fx.question.id, 'answer_id': fx.answer.id}, 'GET',
+                fx.answer.user_id, None),
+
+            ('response cache stats', 'response_cache_stats', {}, 'GET', fx.staff, None),
+            ('job stats', 'job_stats', {}, 'GET', fx.staff, None),
+            ('metrics', 'metrics', {}, 'GET', f"Bearer {METRICS_TOKEN}", None),
+        ]
+
+    def request(self, client, method, path, headers, data):
+        if method == 'GET':
+            response = client.get(path, **headers)
+        else:
+            with transaction.atomic():
+                response = client.generic(method, path, json.dumps(data) if data is not None else '',
+                    content_type='application/json', **headers)
+                transaction.set_rollback(True)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    def run(self, client, case, requests, tokens):
+        label, urlName, kwargs, method, user, data = case
+        path = reverse(urlName, kwargs=kwargs)
+        headers = {}
+        if isinstance(user, str):
+            headers['HTTP_AUTHORIZATION'] = user
+        elif user is not None:
+            if user not in tokens:
+                tokens[user] = str(RefreshToken.for_user(User(id=user)).access_token)
+            headers['HTTP_AUTHORIZATION'] = f"Bearer {tokens[user]}"
+
+        # Warm up caches (response cache, cached users, autocomplete index) before timing
+        status = self.request(client, method, path, headers, data).status_code
+        latencies, queries = [], []
+        for i in range(requests):
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                self.request(client, method, path, headers, data)
+                latencies.append(time.perf_counter() - start)
+            queries.append(len(captured))
+
+        latencies.sort()
+        return {
+            'route': urlName,
+            'method': method,
+            'status': status,
+            'requests_per_second': round(len(latencies) / sum(latencies), 1),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+            'queries': max(queries),
+        }
+
+    def compare(self, results, baseline, tolerance):
+        regressions = []
+        for label, result in results.items():
+            before = baseline['results'].get(label)
+            if before is None:
+                continue
+            if result['queries'] > before['queries']:
+                regressions.append(f"{label}: {before['queries']} -> {result['queries']} queries")
+            # Latency is noisy on shared machines, only flag large relative and absolute slowdowns
+            if result['p50_ms'] > before['p50_ms'] * (1 + tolerance) and result['p50_ms'] - before['p50_ms'] >= 2:
+                regressions.append(f"{label}: p50 {before['p50_ms']} -> {result['p50_ms']} ms")
+            if result['status'] != before['status']:
+                regressions.append(f"{label}: status {before['status']} -> {result['status']}")
+        return regressions
+
+    def handle(self, *args, **options):
+        cases = self.cases(self.fixtures())
+        missing = {pattern.name for pattern in urlpatterns} - {case[1] for case in cases}
+        if missing:
+            self.stderr.write(f"Routes without a benchmark case: {', '.join(sorted(missing))}")
+
+        overrides = {'ALLOWED_HOSTS': ['testserver'], 'METRICS_TOKEN': METRICS_TOKEN}
+        if options['cold']:
+            overrides['RESPONSE_CACHE_TIMEOUT'] = 0
+        results = {}
+        tokens = {}
+        with override_settings(**overrides):
+            client = Client()
+            for case in cases:
+                result = results[case[0]] = self.run(client, case, options['requests'], tokens)
+                self.stdout.write(f"{case[0]:32} {result['method']:6} {result['status']}  "
+                    f"{result['requests_per_second']:8.1f} req/s  p50 {result['p50_ms']:7.2f} ms  "
+                    f"p95 {result['p95_ms']:7.2f} ms  p99 {result['p99_ms']:7.2f} ms  {result['queries']:3} queries")
+
+        report = {
+            'meta': {'created': timezone.now().isoformat(), 'database': connection.vendor,
+                'requests': options['requests'], 'cold': options['cold']},
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(f"Baseline written to {options['output']}")
+
+        if options['compare']:
+            with open(options['compare']) as baselineFile:
+                regressions = self.compare(results, json.load(baselineFile), options['tolerance'])
+            if regressions:
+                raise CommandError("Regressions against the baseline:\n" + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS("No regressions against the baseline"))
@@ -0,0 +1,61 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand
+
+DEFAULT_PATHS = ['/api/opportunities', '/api/opportunitysearch/blank/in/blank', '/api/companies', '/api/companies?page=1']
+
+
+def percentile(sortedValues, fraction):
+    return sortedValues[min(len(sortedValues) - 1, int(len(sortedValues) * fraction))]
+
+
+class Command(BaseCommand):
+    help = "Load a running server (e.g. WSGI vs ASGI deployments) and report requests/s and latency percentiles"
+
+    def add_arguments(self, parser):
+        parser.add_argument('base_url', help="e.g. http://127.0.0.1:8000")
+        parser.add_argument('--path', action='append', dest='paths', help="Path to request, repeatable")
+        parser.add_argument('--requests', type=int, default=1000, help="Requests per path")
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--token', help="JWT access token sent as a Bearer token")
+        parser.add_argument('--json', action='store_true', help="Print results as JSON")
+
+    def fetch(self, url, token):
+        request = Request(url, headers={'Authorization': f"Bearer {token}"} if token else {})
+        start = time.perf_counter()
+        try:
+            with urlopen(request, timeout=60) as response:
+                response.read()
+                status = response.status
+        except HTTPError as error:
+            status = error.code
+        return time.perf_counter() - start, status
+
+    def handle(self, *args, **options):
+        results = {}
+        for path in options['paths'] or DEFAULT_PATHS:
+            url = options['base_url'].rstrip('/') + path
+            self.fetch(url, options['token'])
+            with ThreadPoolExecutor(options['concurrency']) as pool:
+                start = time.perf_counter()
+                samples = list(pool.map(lambda i: self.fetch(url, options['token']), range(options['requests'])))
+                elapsed = time.perf_counter() - start
+
+            latencies = sorted(latency for latency, status in samples)
+            results[path] = {
+                'requests_per_second': round(len(samples) / elapsed, 1),
+                'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+                'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+                'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+                'errors': sum(1 for latency, status in samples if status >= 400),
+            }
+            if not options['json']:
+                result = results[path]
+                self.stdout.write(f"{path:45} {result['requests_per_second']:8.1f} req/s  p50 {result['p50_ms']:7.2f} ms  "
+                    f"p95 {result['p95_ms']:7.2f} ms  p99 {result['p99_ms']:7.2f} ms  errors {result['errors']}")
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
@@ -0,0 +1,52 @@
+import io
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from api.models import Application, Opportunity
+from api.parsers import ORJSONParser
+from api.renderers import ORJSONRenderer, orjson
+from api.serializers import FullApplicationSerializer, OpportunitySerializer
+
+
+class Command(BaseCommand):
+    help = "Compare rendering and parsing time of DRF's stdlib JSON renderer/parser and the orjson ones on " \
+        "OpportunitySerializer and FullApplicationSerializer payloads from the database (see seed_data)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=500, help="Rows per payload")
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def timed(self, function, repeat):
+        start = time.perf_counter()
+        for i in range(repeat):
+            function()
+        return (time.perf_counter() - start) / repeat
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            raise CommandError("orjson is not installed, the renderer and parser fall back to the stdlib")
+
+        rows, repeat = options['rows'], options['repeat']
+        payloads = [
+            ('OpportunitySerializer', OpportunitySerializer(
+                Opportunity.objects.for_listing().order_by('-timestamp')[:rows], many=True).data),
+            ('FullApplicationSerializer', FullApplicationSerializer(
+                Application.objects.select_related('user').order_by('-timestamp')[:rows], many=True).data),
+        ]
+        for name, data in payloads:
+            if not data:
+                raise CommandError("No rows to serialize, run seed_data first")
+            rendered = JSONRenderer().render(data)
+            if ORJSONRenderer().render(data) != rendered:
+                raise CommandError(f"{name}: orjson output differs from JSONRenderer")
+
+            render = self.timed(lambda: JSONRenderer().render(data), repeat)
+            fastRender = self.timed(lambda: ORJSONRenderer().render(data), repeat)
+            parse = self.timed(lambda: JSONParser().parse(io.BytesIO(rendered)), repeat)
+            fastParse = self.timed(lambda: ORJSONParser().parse(io.BytesIO(rendered)), repeat)
+            self.stdout.write(f"{name:26} {len(data)} rows, {len(rendered) / 1024:.0f} KiB, identical output\n"
+                f"  render  json {render * 1000:8.2f} ms  orjson {fastRender * 1000:8.2f} ms  {render / fastRender:5.1f}x\n"
+                f"  parse   json {parse * 1000:8.2f} ms  orjson {fastParse * 1000:8.2f} ms  {parse / fastParse:5.1f}x")
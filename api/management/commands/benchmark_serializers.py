@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from api.fast_serializers import values_serializer
+from api.models import Company, CompanyReview, Opportunity
+from api.serializers import CompanyReviewSerializer, CompanySerializer, OpportunitySerializer
+
+
+class Command(BaseCommand):
+    help = "Compare CPU time per 1,000 rows of the ModelSerializer list path and the values() fast path on the " \
+        "list endpoints' querysets from the database (see seed_data), fetching included"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help="Rows per list")
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def timed(self, function, repeat):
+        # CPU time of this process, the database's own work isn't counted
+        start = time.process_time()
+        for i in range(repeat):
+            function()
+        return (time.process_time() - start) / repeat
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        cases = [
+            (OpportunitySerializer, Opportunity.objects.for_listing().filter(is_active = True).order_by('-timestamp')),
+            (CompanySerializer, Company.objects.all().order_by('name')),
+            (CompanyReviewSerializer, CompanyReview.objects.order_by('-timestamp')),
+        ]
+        for serializerClass, queryset in cases:
+            queryset = queryset[:rows]
+            fast = values_serializer(serializerClass)
+            model = lambda: serializerClass(queryset.all(), many=True).data
+            values = lambda: fast.to_representation(fast.rows(queryset.all()))
+
+            data = model()
+            if not data:
+                raise CommandError("No rows to serialize, run seed_data first")
+            if JSONRenderer().render(values()) != JSONRenderer().render(data):
+                raise CommandError(f"{serializerClass.__name__}: values() output differs from the serializer")
+
+            perThousand = 1000 / len(data)
+            modelTime = self.timed(model, repeat) * perThousand
+            valuesTime = self.timed(values, repeat) * perThousand
+            self.stdout.write(f"{serializerClass.__name__:24} {len(data):6} rows, identical output, per 1,000 rows: "
+                f"serializer {modelTime * 1000:7.2f} ms  values {valuesTime * 1000:7.2f} ms  "
+                f"{modelTime / valuesTime:5.1f}x")
@@ -0,0 +1,102 @@
+import time
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from rest_framework import serializers
+
+from api.models import Company, CompanyQuestion, User
+from api.serializers import CompanyAnswerSerializer, CompanyQuestionSerializer, CompanyReviewSerializer, \
+    OpportunitySerializer, ResumeSerializer, UserCreationSerializer
+
+
+# The per-row create paths before owner stamping (see OwnerStampedSerializer), timed as the baseline
+
+def owned_create_before(serializer, validated_data):
+    # INSERT without the owner, re-fetch the User, then UPDATE every column
+    instance = serializers.ModelSerializer.create(serializer, validated_data)
+    instance.user = User.objects.get(id = serializer.context['request'].user.id)
+    instance.save()
+    return instance
+
+
+@transaction.atomic
+def review_create_before(serializer, validated_data):
+    review = owned_create_before(serializer, validated_data)
+    Company.adjust_review_totals(review.company_id, 1, review.score)
+    return review
+
+
+def user_create_before(serializer, validated_data):
+    # INSERT with the plain password, then UPDATE with its hash
+    user = serializers.ModelSerializer.create(serializer, validated_data)
+    user.set_password(validated_data.pop('password'))
+    user.save()
+    return user
+
+
+class QueryCounter:
+    # Unlike CaptureQueriesContext, not capped by the size of connection.queries
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = "Measure create throughput and queries per create of the write serializers, before and after owner " \
+        "stamping, all writes are rolled back"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=500, help="Rows created per serializer and path")
+
+    def timed(self, serializerClass, payload, context, rows, path, create=None):
+        queries = QueryCounter()
+        with connection.execute_wrapper(queries):
+            start = time.perf_counter()
+            for i in range(rows):
+                serializer = serializerClass(data=payload(f"{path}-{i}"), context=context)
+                serializer.is_valid(raise_exception=True)
+                if create is None:
+                    serializer.save()
+                else:
+                    create(serializer, {**serializer.validated_data})
+            elapsed = time.perf_counter() - start
+        return rows / elapsed, queries.count / rows
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        with transaction.atomic():
+            user = User.objects.create(username='benchmark-writes')
+            company = Company.objects.create(name='Benchmark Writes', industry='-', description='-')
+            question = CompanyQuestion.objects.create(company=company, user=user, question='-')
+            context = {'request': SimpleNamespace(user=user)}
+
+            # (name, serializer, payload for a unique key, create path before)
+            cases = [
+                ('CompanyReviewSerializer', CompanyReviewSerializer,
+                    lambda key: {'company': company.id, 'identification': '-', 'score': '4.0', 'review': '-'},
+                    review_create_before),
+                ('CompanyQuestionSerializer', CompanyQuestionSerializer,
+                    lambda key: {'company': company.id, 'question': '-'}, owned_create_before),
+                ('CompanyAnswerSerializer', CompanyAnswerSerializer,
+                    lambda key: {'company_question': question.id, 'answer': '-'}, owned_create_before),
+                ('ResumeSerializer', ResumeSerializer,
+                    lambda key: {'name': '-', 'summary': '-', 'other': '-'}, owned_create_before),
+                ('OpportunitySerializer', OpportunitySerializer,
+                    lambda key: {'company': company.id, 'position': '-', 'location': '-', 'description': '-', 'image_url': '-'},
+                    owned_create_before),
+                ('UserCreationSerializer', UserCreationSerializer,
+                    lambda key: {'username': f'benchmark-writes-{key}', 'email': 'benchmark@example.com', 'password': 'benchmark'},
+                    user_create_before),
+            ]
+            self.stdout.write(f"{'':28} {'before':33}   {'after':33}")
+            for name, serializerClass, payload, createBefore in cases:
+                beforeRate, beforeQueries = self.timed(serializerClass, payload, context, rows, 'before', createBefore)
+                afterRate, afterQueries = self.timed(serializerClass, payload, context, rows, 'after')
+                self.stdout.write(f"{name:28} {beforeRate:9.1f} creates/s {beforeQueries:5.2f} queries   "
+                    f"{afterRate:9.1f} creates/s {afterQueries:5.2f} queries   {afterRate / beforeRate:4.1f}x")
+
+            transaction.set_rollback(True)
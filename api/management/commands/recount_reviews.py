@@ -0,0 +1,50 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from api import jobs
+from api.caching import bump_versions_on_commit
+from api.models import Company
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored review count and score total of every company"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+            help="Only report companies whose stored totals are out of date, exit with an error if any are found")
+        parser.add_argument('--defer', action='store_true', help="Queue the recount as a background job (see run_jobs)")
+
+    def handle(self, *args, **options):
+        if options['defer']:
+            job = jobs.recount_reviews.enqueue()
+            self.stdout.write(self.style.SUCCESS(f"Queued as job #{job.id}"))
+            return
+
+        with transaction.atomic():
+            companies = Company.objects.select_for_update().annotate(
+                actual_count = Count('review_company_name'),
+                actual_score = Sum('review_company_name__score'),
+            ).order_by('id')
+
+            stale = []
+            for company in companies:
+                actualScore = company.actual_score or Decimal(0)
+                if company.review_total_count != company.actual_count or company.review_total_score != actualScore:
+                    self.stdout.write(f"{company} (#{company.id}): stored {company.review_total_count}/"
+                        f"{company.review_total_score}, actual {company.actual_count}/{actualScore}")
+                    company.review_total_count = company.actual_count
+                    company.review_total_score = actualScore
+                    stale.append(company)
+
+            if options['check']:
+                if stale:
+                    raise CommandError(f"{len(stale)} company review totals out of date")
+                self.stdout.write("Company review totals are up to date")
+                return
+
+            Company.objects.bulk_update(stale, ['review_total_count', 'review_total_score'], batch_size=500)
+            bump_versions_on_commit('company', *[f"company:{company.id}" for company in stale])
+            self.stdout.write(self.style.SUCCESS(f"Updated review totals of {len(stale)} companies"))
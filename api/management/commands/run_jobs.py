@@ -0,0 +1,63 @@
+import json
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.jobs import claim, purge_finished, queue_stats, release, requeue_timed_out, run
+
+# Seconds between timed out job checks and purges of finished jobs
+MAINTENANCE_INTERVAL = 60
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (see api/jobs.py) until stopped with SIGTERM/SIGINT, the job in progress " \
+        "is finished first"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=10, help="Jobs claimed at a time")
+        parser.add_argument('--sleep', type=float, default=1, help="Seconds to wait when the queue is empty")
+        parser.add_argument('--once', action='store_true', help="Run the jobs that are ready and exit")
+        parser.add_argument('--stats', action='store_true', help="Print queue depth and latency and exit")
+
+    def stop(self, signum, frame):
+        self.stopping = True
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.stdout.write(json.dumps(queue_stats(), indent=2))
+            return
+
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        done = failed = 0
+        lastMaintenance = 0
+
+        while not self.stopping:
+            # Connections are reused like in a request, closed past CONN_MAX_AGE or when broken
+            close_old_connections()
+            if time.monotonic() - lastMaintenance > MAINTENANCE_INTERVAL:
+                requeue_timed_out()
+                purge_finished()
+                lastMaintenance = time.monotonic()
+
+            jobs = claim(options['batch'])
+            if not jobs:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+
+            for position, job in enumerate(jobs):
+                if self.stopping:
+                    release(jobs[position:])
+                    break
+                if run(job):
+                    done += 1
+                else:
+                    failed += 1
+
+        close_old_connections()
+        self.stdout.write(f"Stopped, {done} jobs done and {failed} failed")
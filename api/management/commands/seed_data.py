@@ -0,0 +1,155 @@
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from api.autocomplete import company_name_index
+from api.caching import bump_versions_on_commit
+from api.models import AcademicExperience, Application, Company, CompanyAnswer, CompanyQuestion, CompanyReview, \
+    Language, Opportunity, Resume, Saved, User, WorkExperience
+
+BATCH_SIZE = 1000
+PASSWORD = 'seed-password'
+
+FIRST_NAMES = ['Ana', 'Bruno', 'Carla', 'Daniel', 'Elena', 'Felipe', 'Grace', 'Hiro', 'Ines', 'Jonas', 'Kara', 'Luis',
+    'Maya', 'Nadia', 'Omar', 'Paula', 'Rafael', 'Sofia', 'Tomas', 'Yara']
+LAST_NAMES = ['Silva', 'Smith', 'Tanaka', 'Costa', 'Muller', 'Garcia', 'Brown', 'Rossi', 'Nguyen', 'Khan', 'Lopez', 'Kim']
+LOCATIONS = ['Toronto', 'Vancouver', 'Montreal', 'Calgary', 'Ottawa', 'Halifax', 'Winnipeg', 'Remote', 'Victoria',
+    'Quebec City', 'Edmonton', 'Regina']
+INDUSTRIES = ['Health', 'Education', 'Environment', 'Animal Welfare', 'Arts', 'Community', 'Technology', 'Sports',
+    'Housing', 'Food Security']
+COMPANY_WORDS = ['Green', 'Hope', 'United', 'Bright', 'Open', 'Harbour', 'Maple', 'River', 'Northern', 'Kind', 'Shared',
+    'Future', 'Helping', 'Common', 'Little']
+COMPANY_KINDS = ['Foundation', 'Society', 'Network', 'Alliance', 'Centre', 'Collective', 'Trust', 'Project', 'Fund']
+POSITIONS = ['Event Volunteer', 'Tutor', 'Fundraiser', 'Driver', 'Web Developer', 'Coordinator', 'Mentor', 'Coach',
+    'Kitchen Helper', 'Translator', 'Designer', 'Receptionist', 'Dog Walker', 'Gardener', 'Data Analyst']
+SCHOOLS = ['University of Toronto', 'McGill University', 'UBC', 'Seneca College', 'Dalhousie University', 'York University']
+FIELDS = ['Computer Science', 'Nursing', 'Business', 'Biology', 'Design', 'Education', 'Psychology', 'Engineering']
+LANGUAGES = ['English', 'French', 'Portuguese', 'Spanish', 'Mandarin', 'Punjabi', 'Arabic', 'German']
+LEVELS = ['Basic', 'Intermediate', 'Advanced', 'Fluent', 'Native']
+WORDS = ('help support community people team weekly local event program children families seniors food training '
+    'friendly experience organize welcome schedule volunteers project public care learn share great flexible').split()
+
+
+class Command(BaseCommand):
+    help = "Fill the database with a realistic generated dataset, sized by --scale (1 is about 10k rows)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1, help="Multiplies every row count")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed, the same seed and scale give the same data")
+
+    def sentence(self, words):
+        return ' '.join(self.random.choice(WORDS) for i in range(words)).capitalize() + '.'
+
+    def text(self, sentences, maxLength):
+        return ' '.join(self.sentence(self.random.randint(6, 14)) for i in range(sentences))[:maxLength]
+
+    def spread(self, rows, days):
+        # auto_now_add ignores values given to bulk_create, so timestamps are spread with a bulk_update afterwards
+        now = timezone.now()
+        for row in rows:
+            row.timestamp = now - timedelta(seconds=self.random.randint(0, days * 86400))
+        if rows:
+            type(rows[0]).objects.bulk_update(rows, ['timestamp'], batch_size=BATCH_SIZE)
+
+    def create(self, model, rows):
+        created = model.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+        if created and created[0].pk is None:
+            # No RETURNING on this backend, read the new rows back
+            created = list(model.objects.order_by('-pk')[:len(rows)])[::-1]
+        self.stdout.write(f"{model.__name__:20} {len(created):8}")
+        return created
+
+    def handle(self, *args, **options):
+        scale = options['scale']
+        self.random = rng = random.Random(options['seed'])
+        count = lambda base: max(1, int(base * scale))
+        # Offsets keep usernames and company names unique when seeding an already seeded database
+        userOffset = User.objects.count()
+        companyOffset = Company.objects.count()
+
+        with transaction.atomic():
+            password = make_password(PASSWORD)
+            users = self.create(User, [
+                User(username=f"seed{userOffset + i}", password=password, first_name=rng.choice(FIRST_NAMES),
+                    last_name=rng.choice(LAST_NAMES), email=f"seed{userOffset + i}@example.com",
+                    location=rng.choice(LOCATIONS), phone_number=f"555-{rng.randint(1000, 9999)}",
+                    is_staff=(i == 0))
+                for i in range(count(500))])
+            # A tenth of the users post opportunities, the rest look for them
+            posters, seekers = users[:max(1, len(users) // 10)], users[max(1, len(users) // 10):] or users
+
+            companies = self.create(Company, [
+                Company(name=f"{rng.choice(COMPANY_WORDS)} {rng.choice(COMPANY_WORDS)} {rng.choice(COMPANY_KINDS)} "
+                    f"{companyOffset + i}", industry=rng.choice(INDUSTRIES), description=self.text(4, 1000),
+                    image_url=f"https://picsum.photos/seed/company{companyOffset + i}/200")
+                for i in range(count(100))])
+
+            reviews = self.create(CompanyReview, [
+                CompanyReview(company=company, user=rng.choice(seekers), identification=rng.choice(POSITIONS),
+                    score=Decimal(rng.randint(10, 50)) / 10, review=self.text(2, 500))
+                for company in companies for i in range(rng.randint(0, 20))])
+            self.spread(reviews, 365)
+
+            questions = self.create(CompanyQuestion, [
+                CompanyQuestion(company=company, user=rng.choice(seekers), question=self.text(1, 200))
+                for company in companies for i in range(rng.randint(1, 5))])
+            self.spread(questions, 365)
+            answers = self.create(CompanyAnswer, [
+                CompanyAnswer(company_question=question, user=rng.choice(users), answer=self.text(1, 200))
+                for question in questions for i in range(rng.randint(0, 4))])
+            self.spread(answers, 180)
+
+            opportunities = self.create(Opportunity, [
+                Opportunity(user=rng.choice(posters), company=rng.choice(companies), position=rng.choice(POSITIONS),
+                    location=rng.choice(LOCATIONS), description=self.text(5, 1000),
+                    image_url=f"https://picsum.photos/seed/opportunity{i}/400",
+                    question_1=self.sentence(8), question_2=self.sentence(8) if rng.random() < 0.5 else '',
+                    is_active=rng.random() < 0.9)
+                for i in range(count(1000))])
+            self.spread(opportunities, 180)
+
+            saved = self.create(Saved, [
+                Saved(user=user, opportunity=opportunity)
+                for user in seekers for opportunity in rng.sample(opportunities, min(len(opportunities), rng.randint(0, 6)))])
+            self.spread(saved, 90)
+
+            resumes = self.create(Resume, [
+                Resume(user=user, name=f"{user.first_name} {user.last_name} - {rng.choice(POSITIONS)}",
+                    summary=self.text(3, 1000), other=self.text(1, 1000))
+                for user in seekers])
+            self.create(WorkExperience, [
+                WorkExperience(resume=resume, company=rng.choice(companies).name[:50], position=rng.choice(POSITIONS),
+                    location=rng.choice(LOCATIONS), industry=rng.choice(INDUSTRIES), description=self.text(2, 500),
+                    start_date=date(2010 + i * 3, rng.randint(1, 12), 1),
+                    end_date=date(2012 + i * 3, rng.randint(1, 12), 1) if rng.random() < 0.8 else None)
+                for resume in resumes for i in range(rng.randint(1, 4))])
+            self.create(AcademicExperience, [
+                AcademicExperience(resume=resume, school=rng.choice(SCHOOLS), field=rng.choice(FIELDS),
+                    course=rng.choice(['Bachelor', 'Diploma', 'Master', 'Certificate']), location=rng.choice(LOCATIONS),
+                    description=self.text(1, 500), start_date=date(2004 + i * 4, 9, 1), end_date=date(2008 + i * 4, 6, 1))
+                for resume in resumes for i in range(rng.randint(1, 3))])
+            self.create(Language, [
+                Language(resume=resume, name=name, level=rng.choice(LEVELS))
+                for resume in resumes for name in rng.sample(LANGUAGES, rng.randint(1, 3))])
+
+            applications = self.create(Application, [
+                Application(user_id=resume.user_id, resume=resume, opportunity=opportunity, answer_1=self.text(1, 500))
+                for resume in resumes
+                for opportunity in rng.sample(opportunities, min(len(opportunities), rng.randint(0, 8)))
+                if opportunity.user_id != resume.user_id])
+            self.spread(applications, 90)
+
+            bump_versions_on_commit('company', 'companyreview', 'opportunity')
+
+        # bulk_create skips the review total bookkeeping and the signals the autocomplete index listens to
+        call_command('recount_reviews', stdout=StringIO())
+        company_name_index.invalidate()
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(users)} users, log in as seed{userOffset} (staff) or any seedN with password {PASSWORD}"))
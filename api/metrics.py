@@ -0,0 +1,180 @@
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from asgiref.local import Local
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+
+# Per request instrumentation. Every query runs through record_query, which adds to the stats of the request in
+# progress (an asgiref Local, so queries run by read_view's thread pool count too). RequestMetricsMiddleware
+# reports them in a Server-Timing header and aggregates them into in-process histograms, rendered in the
+# Prometheus text format by the metrics view. Each gunicorn worker keeps its own metrics, labeled with its pid.
+# Queries of streamed responses run after the middleware returns and are not counted.
+
+_state = Local()
+
+
+class RequestStats:
+    __slots__ = ('queries', 'db', 'renderStart')
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.renderStart = None
+
+
+def record_query(execute, sql, params, many, context):
+    stats = getattr(_state, 'stats', None)
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db += time.perf_counter() - start
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    # Sent on every (re)connect of the same wrapper
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class Histogram:
+
+    def __init__(self, name, help, buckets):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            # Bucket counts (last one is +Inf), sum
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self, labelNames, extra):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in sorted(self.series.items()):
+            labelText = ','.join(f'{name}="{value}"' for name, value in zip(labelNames, labels)) + extra
+            cumulative = 0
+            for bound, count in zip(list(self.buckets) + ['+Inf'], counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labelText},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{labelText}}} {round(total, 6)}")
+            lines.append(f"{self.name}_count{{{labelText}}} {cumulative}")
+        return lines
+
+
+class Counter:
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.series = {}
+
+    def inc(self, labels):
+        self.series[labels] = self.series.get(labels, 0) + 1
+
+    def render(self, labelNames, extra):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self.series.items()):
+            labelText = ','.join(f'{name}="{value}"' for name, value in zip(labelNames, labels)) + extra
+            lines.append(f"{self.name}{{{labelText}}} {value}")
+        return lines
+
+
+class RequestMetrics:
+    LABELS = ('route', 'method', 'status')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.duration = Histogram('http_request_duration_seconds', "Time from request to response",
+            (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+        self.db = Histogram('http_request_db_seconds', "Time spent running SQL queries",
+            (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1))
+        self.render = Histogram('http_request_render_seconds', "Time spent rendering the response",
+            (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1))
+        self.queries = Histogram('http_request_queries', "SQL queries per request",
+            (0, 1, 2, 3, 5, 8, 13, 21, 34, 55))
+        self.size = Histogram('http_response_size_bytes', "Response body size, streamed responses are not counted",
+            (256, 1024, 4096, 16384, 65536, 262144, 1048576))
+        self.overBudget = Counter('http_requests_over_query_budget_total',
+            "Requests that ran more SQL queries than settings.QUERY_BUDGET")
+
+    def observe(self, labels, duration, db, render, queries, size, overBudget):
+        with self.lock:
+            self.duration.observe(labels, duration)
+            self.db.observe(labels, db)
+            self.render.observe(labels, render)
+            self.queries.observe(labels, queries)
+            if size is not None:
+                self.size.observe(labels, size)
+            if overBudget:
+                self.overBudget.inc(labels)
+
+    def render_text(self):
+        extra = f',worker="{os.getpid()}"'
+        with self.lock:
+            lines = []
+            for metric in (self.duration, self.db, self.render, self.queries, self.size, self.overBudget):
+                lines.extend(metric.render(self.LABELS, extra))
+        return '\n'.join(lines) + '\n'
+
+
+request_metrics = RequestMetrics()
+
+
+class RequestMetricsMiddleware:
+    """
+    Times each request, the SQL it ran and its rendering, labeled by URL name. The view's own time (serializers
+    included) is what remains, reported as "app".
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = _state.stats = RequestStats()
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.stats = None
+        end = time.perf_counter()
+
+        total = end - start
+        render = end - stats.renderStart if stats.renderStart is not None else 0
+        app = max(total - stats.db - render, 0)
+        match = request.resolver_match
+        route = (match.url_name or match.route) if match is not None else 'unmatched'
+        overBudget = bool(settings.QUERY_BUDGET) and stats.queries > settings.QUERY_BUDGET
+        request_metrics.observe((route, request.method, str(response.status_code)), total, stats.db, render,
+            stats.queries, None if response.streaming else len(response.content), overBudget)
+
+        if overBudget:
+            logger.warning("%s %s ran %d SQL queries, over the budget of %d (%s)", request.method, request.path,
+                stats.queries, settings.QUERY_BUDGET, route)
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = (f'db;dur={stats.db * 1000:.2f};desc="{stats.queries} queries", '
+                f'app;dur={app * 1000:.2f}, render;dur={render * 1000:.2f}, total;dur={total * 1000:.2f}')
+        return response
+
+    def process_template_response(self, request, response):
+        # Called right before the response is rendered
+        stats = getattr(_state, 'stats', None)
+        if stats is not None:
+            stats.renderStart = time.perf_counter()
+        return response
@@ -0,0 +1,35 @@
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_review_totals(apps, schema_editor):
+    Company = apps.get_model('api', 'Company')
+    companies = list(Company.objects.annotate(
+        actual_count = Count('review_company_name'),
+        actual_score = Sum('review_company_name__score'),
+    ))
+    for company in companies:
+        company.review_total_count = company.actual_count
+        company.review_total_score = company.actual_score or 0
+    Company.objects.bulk_update(companies, ['review_total_count', 'review_total_score'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='review_total_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='company',
+            name='review_total_score',
+            field=models.DecimalField(decimal_places=1, default=0, max_digits=12),
+        ),
+        migrations.RunPython(backfill_review_totals, migrations.RunPython.noop),
+    ]
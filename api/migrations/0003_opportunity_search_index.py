@@ -0,0 +1,92 @@
+from django.db import migrations
+
+
+POSTGRES_VECTOR = """
+    setweight(to_tsvector('english', coalesce({row}position, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce({row}description, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce({row}location, '')), 'C')
+"""
+
+POSTGRES_FORWARD = [
+    "ALTER TABLE api_opportunity ADD COLUMN search_vector tsvector",
+    f"""
+    CREATE FUNCTION api_opportunity_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := {POSTGRES_VECTOR.format(row='NEW.')};
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER api_opportunity_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF position, description, location ON api_opportunity
+    FOR EACH ROW EXECUTE PROCEDURE api_opportunity_search_vector_update()
+    """,
+    f"UPDATE api_opportunity SET search_vector = {POSTGRES_VECTOR.format(row='')}",
+    "CREATE INDEX api_opportunity_search_vector_gin ON api_opportunity USING gin (search_vector)",
+]
+
+POSTGRES_REVERSE = [
+    "DROP TRIGGER api_opportunity_search_vector_trigger ON api_opportunity",
+    "DROP FUNCTION api_opportunity_search_vector_update()",
+    "ALTER TABLE api_opportunity DROP COLUMN search_vector",
+]
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE api_opportunity_fts USING fts5(
+        position, description, location, content='api_opportunity', content_rowid='id', tokenize='porter unicode61')
+    """,
+    """
+    CREATE TRIGGER api_opportunity_fts_insert AFTER INSERT ON api_opportunity BEGIN
+        INSERT INTO api_opportunity_fts(rowid, position, description, location)
+        VALUES (new.id, new.position, new.description, new.location);
+    END
+    """,
+    """
+    CREATE TRIGGER api_opportunity_fts_delete AFTER DELETE ON api_opportunity BEGIN
+        INSERT INTO api_opportunity_fts(api_opportunity_fts, rowid, position, description, location)
+        VALUES ('delete', old.id, old.position, old.description, old.location);
+    END
+    """,
+    """
+    CREATE TRIGGER api_opportunity_fts_update AFTER UPDATE OF position, description, location ON api_opportunity BEGIN
+        INSERT INTO api_opportunity_fts(api_opportunity_fts, rowid, position, description, location)
+        VALUES ('delete', old.id, old.position, old.description, old.location);
+        INSERT INTO api_opportunity_fts(rowid, position, description, location)
+        VALUES (new.id, new.position, new.description, new.location);
+    END
+    """,
+    "INSERT INTO api_opportunity_fts(api_opportunity_fts) VALUES ('rebuild')",
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER api_opportunity_fts_update",
+    "DROP TRIGGER api_opportunity_fts_delete",
+    "DROP TRIGGER api_opportunity_fts_insert",
+    "DROP TABLE api_opportunity_fts",
+]
+
+
+# Note: SQLite drops these triggers when Django remakes api_opportunity (AlterField, RemoveField...), any such
+# migration has to run SQLITE_FORWARD again.
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_company_review_totals'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor({'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            run_for_vendor({'postgresql': POSTGRES_REVERSE, 'sqlite': SQLITE_REVERSE}),
+        ),
+    ]
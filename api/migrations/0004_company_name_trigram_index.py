@@ -0,0 +1,25 @@
+from django.db import migrations
+
+
+# Only PostgreSQL gets a trigram index, other backends use the in-process index in api/autocomplete.py
+
+def create_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        schema_editor.execute("CREATE INDEX api_company_name_trgm ON api_company USING gin (name gin_trgm_ops)")
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX api_company_name_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_opportunity_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 3.1.6 on 2026-10-18 09:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_company_name_trigram_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='application',
+            index=models.Index(fields=['opportunity', '-timestamp', '-id'], name='application_opp_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='application',
+            index=models.Index(fields=['user', '-timestamp', '-id'], name='application_user_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='companyanswer',
+            index=models.Index(fields=['company_question', '-timestamp', '-id'], name='answer_question_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='companyquestion',
+            index=models.Index(fields=['company', '-timestamp', '-id'], name='question_company_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='companyreview',
+            index=models.Index(fields=['company', '-timestamp', '-id'], name='review_company_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='opportunity',
+            index=models.Index(fields=['is_active', '-timestamp', '-id'], name='opportunity_active_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='opportunity',
+            index=models.Index(condition=models.Q(is_active=True), fields=['-timestamp', '-id'], name='opportunity_active_only_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='opportunity',
+            index=models.Index(fields=['user', '-timestamp', '-id'], name='opportunity_user_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='saved',
+            index=models.Index(fields=['user', '-timestamp', '-id'], name='saved_user_ts_idx'),
+        ),
+    ]
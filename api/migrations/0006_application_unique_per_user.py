@@ -0,0 +1,29 @@
+# Generated by Django 3.1.6 on 2026-10-18 09:55
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_applications(apps, schema_editor):
+    # Keep each user's first application to an opportunity
+    Application = apps.get_model('api', 'Application')
+    duplicates = Application.objects.filter(user__isnull=False).values('user', 'opportunity')\
+        .annotate(first_id=Min('id'), total=Count('id')).filter(total__gt=1)
+    for duplicate in duplicates:
+        Application.objects.filter(user=duplicate['user'], opportunity=duplicate['opportunity'])\
+            .exclude(id=duplicate['first_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_access_pattern_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_applications, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='application',
+            constraint=models.UniqueConstraint(fields=('user', 'opportunity'), name='unique_application_per_user'),
+        ),
+    ]
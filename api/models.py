@@ -1,7 +1,8 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.db.models.deletion import CASCADE
-from django.db.models import Avg
+from django.db.models import Count, Exists, F, OuterRef, Prefetch, Q, Subquery
+from django.db.models.functions import Coalesce
 
 
 class User(AbstractUser):
@@ -17,14 +18,30 @@ class Company(models.Model):
     industry = models.CharField(max_length=50)
     description = models.CharField(max_length=1000)
     image_url = models.CharField(max_length=200, blank=True)
+    # Kept in sync by CompanyReviewSerializer / SingleCompanyReviewView, see recount_reviews command
+    review_total_count = models.PositiveIntegerField(default=0)
+    review_total_score = models.DecimalField(max_digits=12, decimal_places=1, default=0)
 
     @property
     def review_count(self):
-        return CompanyReview.objects.filter(company__id=self.id).count(),
+        return self.review_total_count,
 
     @property
     def review_avg(self):
-        return CompanyReview.objects.filter(company__id=self.id).aggregate(Avg('score'))['score__avg']
+        return self.average_review_score(self.review_total_count, self.review_total_score)
+
+    @staticmethod
+    def average_review_score(count, score):
+        if not count:
+            return None
+        return score / count
+
+    @staticmethod
+    def adjust_review_totals(company_id, count, score):
+        # Must be called inside the transaction that writes the review
+        Company.objects.filter(id = company_id).update(
+            review_total_count = F('review_total_count') + count,
+            review_total_score = F('review_total_score') + score)
 
     def __str__(self):
         return f"{self.name}"
@@ -39,11 +56,32 @@ class CompanyReview(models.Model):
     score = models.DecimalField(max_digits=2, decimal_places=1)
     review = models.CharField(max_length=500)
     timestamp = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['company', '-timestamp', '-id'], name='review_company_ts_idx'),
+        ]
     
     def __str__(self):
         return f"Review #{self.id} - {self.company.name}"
 
 
+class OpportunityQuerySet(models.QuerySet):
+    def for_listing(self):
+        # Company joined for company_name / review totals, applicants counted in the same query. A correlated
+        # subquery rather than a JOIN + GROUP BY, so list ordering can still be read off the timestamp indexes.
+        applicants = Application.objects.filter(opportunity=OuterRef('pk')).order_by()\
+            .values('opportunity').annotate(total=Count('*')).values('total')
+        return self.select_related('company')\
+            .annotate(applicant_total=Coalesce(Subquery(applicants, output_field=models.IntegerField()), 0))
+
+    def with_user_flags(self, user_id):
+        # The user's saved record (saved_id, None if not saved) and whether they applied, as correlated subqueries
+        saved = Saved.objects.filter(opportunity=OuterRef('pk'), user_id=user_id).order_by('-id').values('id')[:1]
+        applied = Application.objects.filter(opportunity=OuterRef('pk'), user_id=user_id)
+        return self.annotate(saved_id=Subquery(saved, output_field=models.IntegerField()), has_applied=Exists(applied))
+
+
 class Opportunity(models.Model):
     user = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name="opportunity_poster", null=True)
@@ -61,16 +99,27 @@ class Opportunity(models.Model):
     is_active = models.BooleanField(default=True)
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    objects = OpportunityQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_active', '-timestamp', '-id'], name='opportunity_active_ts_idx'),
+            models.Index(fields=['-timestamp', '-id'], condition=Q(is_active=True), name='opportunity_active_only_ts_idx'),
+            models.Index(fields=['user', '-timestamp', '-id'], name='opportunity_user_ts_idx'),
+        ]
+
     @property
     def review_count(self):
-        return CompanyReview.objects.filter(company__id=self.id).count(),
+        return self.company.review_count
 
     @property
     def review_avg(self):
-        return CompanyReview.objects.filter(company__id=self.id).aggregate(Avg('score'))['score__avg']
+        return self.company.review_avg
 
     @property
     def applicant_count(self):
+        if hasattr(self, 'applicant_total'):
+            return self.applicant_total,
         return Application.objects.filter(opportunity__id=self.id).count(),
 
     def __str__(self):
@@ -86,12 +135,27 @@ class Saved(models.Model):
         Opportunity, on_delete=models.CASCADE, related_name="saved_opportunity")
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-timestamp', '-id'], name='saved_user_ts_idx'),
+        ]
+
     def __str__(self):
         return f"Opportunity #{self.id} - Saved by {self.user.username}"
 
 
 # Questions and Answers
 
+class CompanyQuestionQuerySet(models.QuerySet):
+    def with_latest_answers(self, limit):
+        # The newest `limit` answers of every question in latest_answers, in one query for any number of questions:
+        # each answer is kept if it's among its question's first `limit` (correlated subquery on answer_question_ts_idx)
+        latest = CompanyAnswer.objects.filter(company_question=OuterRef('company_question'))\
+            .order_by('-timestamp', '-id').values('id')[:limit]
+        answers = CompanyAnswer.objects.filter(id__in=Subquery(latest)).order_by('-timestamp', '-id')
+        return self.prefetch_related(Prefetch('company_answer_question', queryset=answers, to_attr='latest_answers'))
+
+
 class CompanyQuestion(models.Model):
     company = models.ForeignKey(
         Company, on_delete=models.CASCADE, related_name="company_question_company")
@@ -100,6 +164,13 @@ class CompanyQuestion(models.Model):
     question = models.CharField(max_length=200)
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    objects = CompanyQuestionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['company', '-timestamp', '-id'], name='question_company_ts_idx'),
+        ]
+
     def __str__(self):
         return f"Question #{self.id} - Asked by {self.user.username}"
 
@@ -112,12 +183,28 @@ class CompanyAnswer(models.Model):
     answer = models.CharField(max_length=200)
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['company_question', '-timestamp', '-id'], name='answer_question_ts_idx'),
+        ]
+
     def __str__(self):
         return f"Answer #{self.id} - Answered by {self.user.username}"
 
 
 # Resumes
 
+class ResumeQuerySet(models.QuerySet):
+    def with_sections(self):
+        # One query per section for any number of resumes, ordered like the section list views
+        experienceOrder = (F('end_date').desc(nulls_first=True), F('start_date').desc())
+        return self.prefetch_related(
+            Prefetch('wk_experience_resume', queryset=WorkExperience.objects.order_by(*experienceOrder)),
+            Prefetch('ac_experience_resume', queryset=AcademicExperience.objects.order_by(*experienceOrder)),
+            Prefetch('language_resume', queryset=Language.objects.order_by('id')),
+        )
+
+
 class Resume(models.Model):
     user = models.ForeignKey(User, on_delete=CASCADE,
                              related_name="resume_user", null=True)
@@ -125,6 +212,8 @@ class Resume(models.Model):
     summary = models.TextField(null=True)
     other = models.TextField(null=True)
 
+    objects = ResumeQuerySet.as_manager()
+
     def __str__(self):
         return f"Resume #{self.id} - {self.name} by {self.user.username}"
 
@@ -185,5 +274,61 @@ class Application(models.Model):
     answer_4 = models.TextField(blank=True)
     answer_5 = models.TextField(blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['opportunity', '-timestamp', '-id'], name='application_opp_ts_idx'),
+            models.Index(fields=['user', '-timestamp', '-id'], name='application_user_ts_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'opportunity'], name='unique_application_per_user'),
+        ]
+
+    def __str__(self):
+        return f"Application #{self.id} by {self.user.username}"
+
+# Response cache
+
+class CacheVersion(models.Model):
+    # Version of a cached dependency (see caching.py), kept in the database so every worker and node agrees on it
+    name = models.CharField(max_length=150, primary_key=True)
+    version = models.BigIntegerField()
+    modified = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+
+# Background jobs
+
+class Job(models.Model):
+    # See jobs.py
+    PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+    STATUSES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    name = models.CharField(max_length=100)
+    arguments = models.JSONField(default=list)
+    # Pending jobs with the same key are one job
+    key = models.CharField(max_length=150)
+    priority = models.SmallIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_at = models.DateTimeField()
+    timestamp = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Claim of the worker running it
+    worker = models.CharField(max_length=100, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-priority', 'run_at', 'id'], condition=Q(status='pending'), name='job_pending_idx'),
+            models.Index(fields=['status', 'finished_at'], name='job_status_finished_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['key'], condition=Q(status='pending'), name='unique_pending_job_key'),
+        ]
+
     def __str__(self):
-        return f"Application #{self.id} by {self.user.username}"
\ No newline at end of file
+        return f"Job #{self.id} - {self.name} ({self.status})"
@@ -0,0 +1,89 @@
+import random
+
+from asgiref.local import Local
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+
+# Read replica routing. Safe-method requests read from one of settings.REPLICA_DATABASES, everything else (and any
+# read after a write in the same request) uses the primary. A user who wrote is pinned to the primary for
+# REPLICA_PIN_SECONDS so they never read a replica that hasn't caught up with their own change. The pins live in
+# the default cache, which must be shared across workers (settings refuse replicas otherwise).
+
+_state = Local()
+
+
+def pin_key(user_id):
+    return f"replica-pin:{user_id}"
+
+
+def read_from_primary():
+    """Sends the rest of the current request's reads to the primary."""
+    _state.replica = None
+
+
+def token_user_id(request):
+    # The routing decision is made before DRF authenticates, so read the user id from the access token itself
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    if header is None:
+        return None
+    try:
+        rawToken = authentication.get_raw_token(header)
+        if rawToken is None:
+            return None
+        return authentication.get_validated_token(rawToken).get(api_settings.USER_ID_CLAIM)
+    except (AuthenticationFailed, InvalidToken):
+        return None
+
+
+class ReplicaRoutingMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        userId = token_user_id(request)
+        safe = request.method in SAFE_METHODS
+        if safe and not (userId is not None and cache.get(pin_key(userId))):
+            _state.replica = random.choice(settings.REPLICA_DATABASES)
+        else:
+            _state.replica = None
+        try:
+            response = self.get_response(request)
+        finally:
+            # Streamed responses are consumed after this point and read from the primary
+            _state.replica = None
+
+        if not safe and userId is not None and response.status_code < 400:
+            cache.set(pin_key(userId), True, settings.REPLICA_PIN_SECONDS)
+        return response
+
+
+class ReplicaRouter:
+    """
+    Routes reads to the replica picked for the current request by ReplicaRoutingMiddleware, all writes and
+    migrations go to the primary. Replicas hold the same data, so relations between them are allowed.
+    """
+
+    def db_for_read(self, model, **hints):
+        replica = getattr(_state, 'replica', None)
+        if replica is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        # Read your own write within the request too
+        read_from_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
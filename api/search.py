@@ -0,0 +1,51 @@
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+
+
+# Full-text search over opportunities. The index lives outside the Django model and is kept up to date by
+# database triggers (see migration 0003), so every save, bulk write or queryset update is indexed incrementally:
+# - PostgreSQL: api_opportunity.search_vector (weighted tsvector) with a GIN index
+# - SQLite: api_opportunity_fts, an external content FTS5 table over api_opportunity
+# Other backends fall back to the previous icontains filters.
+
+def search_terms(text):
+    return re.findall(r'\w+', text.lower())
+
+
+def postgres_query(positionTerms, locationTerms):
+    # Position terms may match the position (weight A) or description (weight B), location terms the location (C)
+    return ' & '.join([f"{term}:*AB" for term in positionTerms] + [f"{term}:*C" for term in locationTerms])
+
+
+def sqlite_query(positionTerms, locationTerms):
+    return ' AND '.join([f'{{position description}} : "{term}"*' for term in positionTerms] +
+        [f'location : "{term}"*' for term in locationTerms])
+
+
+def search_opportunities(queryset, position, location):
+    positionTerms, locationTerms = search_terms(position), search_terms(location)
+    if not positionTerms and not locationTerms:
+        return queryset.order_by('-timestamp')
+
+    if connection.vendor == 'postgresql':
+        query = postgres_query(positionTerms, locationTerms)
+        return queryset.filter(RawSQL("api_opportunity.search_vector @@ to_tsquery('english', %s)", [query],
+                output_field=BooleanField()))\
+            .annotate(rank=RawSQL("ts_rank(api_opportunity.search_vector, to_tsquery('english', %s))", [query],
+                output_field=FloatField()))\
+            .order_by('-rank', '-timestamp')
+
+    if connection.vendor == 'sqlite':
+        query = sqlite_query(positionTerms, locationTerms)
+        # Joined so the MATCH runs once and ranks come from that scan, a correlated bm25() subquery would run it
+        # again for every match. bm25() is lower for better matches, position hits weigh more than description and
+        # location hits
+        return queryset.extra(tables=['api_opportunity_fts'],
+                where=['api_opportunity_fts.rowid = api_opportunity.id', 'api_opportunity_fts MATCH %s'], params=[query],
+                select={'rank': 'bm25(api_opportunity_fts, 10.0, 2.0, 1.0)'})\
+            .order_by('rank', '-timestamp')
+
+    return queryset.filter(position__icontains = position, location__icontains = location).order_by('-timestamp')
@@ -1,8 +1,26 @@
-from rest_framework import serializers
+from django.db import IntegrityError, connection, transaction
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException, NotFound
 from rest_framework.fields import SerializerMethodField
 from .models import AcademicExperience, Company, CompanyAnswer, CompanyQuestion, Resume, User, Opportunity, \
     Saved, CompanyReview, Language, WorkExperience, AcademicExperience, CompanyQuestion, CompanyAnswer, Application
 
+class Conflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Record already exists'
+    default_code = 'conflict'
+
+
+class OwnerStampedSerializer(serializers.ModelSerializer):
+    # Creates rows owned by the logged in user, the owner is set before the INSERT so a create is a single write
+    owner_field = 'user'
+
+    def create(self, validated_data):
+        validated_data.pop(self.owner_field, None)
+        validated_data[f"{self.owner_field}_id"] = self.context['request'].user.id
+        return super().create(validated_data)
+
+
 # User
 
 class UserCreationSerializer(serializers.ModelSerializer):
@@ -11,8 +29,9 @@ class UserCreationSerializer(serializers.ModelSerializer):
         fields = ('id','username', 'first_name', 'last_name', 'email', 'password')
 
     def create(self, validated_data):
-        user = super().create(validated_data)
-        user.set_password(validated_data.pop('password'))
+        password = validated_data.pop('password')
+        user = User(**validated_data)
+        user.set_password(password)
         user.save()
         return user
 
@@ -28,43 +47,80 @@ class UserSerializer(serializers.ModelSerializer):
 class CompanySerializer(serializers.ModelSerializer):
     review_count = serializers.ReadOnlyField()
     review_avg = serializers.ReadOnlyField()
+    # For list endpoints served from values() rows, see fast_serializers
+    values_fields = {
+        'review_count': (('review_total_count',), lambda count: (count,)),
+        'review_avg': (('review_total_count', 'review_total_score'), Company.average_review_score),
+    }
 
     class Meta:
         model = Company
         fields = ('id', 'name', 'industry', 'description', 'image_url', 'review_count', 'review_avg')
 
 
-class CompanyReviewSerializer(serializers.ModelSerializer):
+class CompanyReviewSerializer(OwnerStampedSerializer):
     class Meta:
         model = CompanyReview
         fields = ('id', 'user', 'company', 'identification', 'score', 'review', 'timestamp')
 
+    @transaction.atomic
     def create(self, validated_data):
         review = super().create(validated_data)
-        review.user = User.objects.get(id = self.context['request'].user.id)
-        review.save()
+        Company.adjust_review_totals(review.company_id, 1, review.score)
+        return review
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        # The stored company and score, not the instance's: the row stays locked until commit, so a concurrent
+        # edit or delete of the review waits and then reads this edit's values
+        stored = CompanyReview.objects.select_for_update().filter(pk = instance.pk)\
+            .values('company_id', 'score').first()
+        if stored is None:
+            raise NotFound()
+        review = super().update(instance, validated_data)
+        Company.adjust_review_totals(stored['company_id'], -1, -stored['score'])
+        Company.adjust_review_totals(review.company_id, 1, review.score)
         return review
 
 
 # Opportunity
 
-class OpportunitySerializer(serializers.ModelSerializer):
+class OpportunitySerializer(OwnerStampedSerializer):
     company_name = serializers.SerializerMethodField('get_company_name')
 
     def get_company_name(self, obj):
         return obj.company.name
 
+    # applicant_count needs a for_listing() queryset
+    values_fields = {
+        'company_name': (('company__name',), lambda name: name),
+        'applicant_count': (('applicant_total',), lambda total: (total,)),
+    }
+
     class Meta:
         model = Opportunity
         fields = ('id', 'user', 'company', 'company_name', 'position', 'location', 'description', 'image_url', 'question_1', \
             'question_2', 'question_3', 'question_4', 'question_5', 'is_active', 'applicant_count', 'timestamp')
 
-    def create(self, validated_data):
-        opportunity = super().create(validated_data)
-        user = User.objects.get(id = self.context['request'].user.id)
-        opportunity.user = user
-        opportunity.save()
-        return opportunity
+
+class OpportunityUserFlagsSerializer(OpportunitySerializer):
+    # Authenticated lists, needs a with_user_flags() queryset
+    is_saved = serializers.SerializerMethodField()
+    has_applied = serializers.BooleanField(read_only=True)
+    saved_id = serializers.IntegerField(read_only=True)
+
+    def get_is_saved(self, obj):
+        return obj.saved_id is not None
+
+    values_fields = {
+        **OpportunitySerializer.values_fields,
+        'is_saved': (('saved_id',), lambda savedId: savedId is not None),
+        'has_applied': (('has_applied',), bool),
+        'saved_id': (('saved_id',), lambda savedId: savedId),
+    }
+
+    class Meta(OpportunitySerializer.Meta):
+        fields = OpportunitySerializer.Meta.fields + ('is_saved', 'has_applied', 'saved_id')
 
 
 # Saved
@@ -76,9 +132,7 @@ class SavedOpportunitiesSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         if validated_data['user'].id == self.context['request'].user.id:
-            favorite = super().create(validated_data)
-            favorite.save()
-            return favorite
+            return super().create(validated_data)
         else: 
             raise serializers.ValidationError("Error manipulating record")
             
@@ -93,90 +147,76 @@ class SavedOpportunitiesExpandedSerializer(serializers.ModelSerializer):
 
 # Questions and Answers
 
-class CompanyQuestionSerializer(serializers.ModelSerializer):
+class CompanyQuestionSerializer(OwnerStampedSerializer):
     class Meta:
         model = CompanyQuestion
         fields = ('id', 'company', 'user', 'question', 'timestamp')
 
-    def create(self, validated_data):
-        question = super().create(validated_data)
-        question.user = User.objects.get(id = self.context['request'].user.id)
-        question.save()
-        return question
-
 
-class CompanyAnswerSerializer(serializers.ModelSerializer):
+class CompanyAnswerSerializer(OwnerStampedSerializer):
     class Meta:
         model = CompanyAnswer
         fields = ('id', 'company_question', 'user', 'answer', 'timestamp')
 
-    def create(self, validated_data):
-        answer = super().create(validated_data)
-        answer.user = User.objects.get(id = self.context['request'].user.id)
-        answer.save()
-        return answer
-
 
 # Resume
 
-class ResumeSerializer(serializers.ModelSerializer):
+class ResumeSerializer(OwnerStampedSerializer):
     class Meta:
         model = Resume
         fields = ('id', 'user', 'name', 'summary', 'other')
 
-    def create(self, validated_data):
-        resume = super().create(validated_data)
-        resume.user = User.objects.get(id = self.context['request'].user.id)
-        resume.save()
-        return resume
 
+class ResumeSectionListSerializer(serializers.ListSerializer):
+    # Bulk writes for a resume section, the resume (ownership already checked) comes from the context
 
-class WorkExperienceSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = WorkExperience
-        fields = ('id', 'resume', 'company', 'position', 'location', 'industry', 'start_date', 'end_date', 'description')        
+    def create(self, validated_data):
+        model = self.child.Meta.model
+        resume = self.context['resume']
+        rows = model.objects.bulk_create([model(resume = resume, **item) for item in validated_data])
+        if not connection.features.can_return_rows_from_bulk_insert:
+            # No ids back from the INSERT (SQLite), the transaction's writes are the resume's newest rows
+            rows = list(model.objects.filter(resume = resume).order_by('-id')[:len(rows)])[::-1]
+        return rows
+
+    def replace(self):
+        self.child.Meta.model.objects.filter(resume = self.context['resume']).delete()
+        return self.save()
+
+
+class ResumeSectionSerializer(serializers.ModelSerializer):
+    def get_fields(self):
+        fields = super().get_fields()
+        if 'resume' in self.context:
+            fields['resume'] = serializers.PrimaryKeyRelatedField(read_only=True)
+        return fields
 
     def create(self, validated_data):
         # Check if resume creator is user logged in
-        resumeUser = Resume.objects.get(id = validated_data['resume'].id).user.id
-
-        if resumeUser == self.context['request'].user.id :
-            workExperience = super().create(validated_data)
-            workExperience.save()
-            return workExperience
+        if validated_data['resume'].user_id == self.context['request'].user.id :
+            return super().create(validated_data)
         raise serializers.ValidationError("Access denied")
 
 
-class AcademicExperienceSerializer(serializers.ModelSerializer):
+class WorkExperienceSerializer(ResumeSectionSerializer):
     class Meta:
-        model = AcademicExperience
-        fields = ('id', 'resume', 'school', 'field', 'course', 'location', 'start_date', 'end_date', 'description')
+        model = WorkExperience
+        fields = ('id', 'resume', 'company', 'position', 'location', 'industry', 'start_date', 'end_date', 'description')        
+        list_serializer_class = ResumeSectionListSerializer
 
-    def create(self, validated_data):
-        # Check if resume creator is user logged in
-        resumeUser = Resume.objects.get(id = validated_data['resume'].id).user.id
 
-        if resumeUser == self.context['request'].user.id :
-            academicExperience = super().create(validated_data)
-            academicExperience.save()
-            return academicExperience
-        raise serializers.ValidationError("Access denied")
+class AcademicExperienceSerializer(ResumeSectionSerializer):
+    class Meta:
+        model = AcademicExperience
+        fields = ('id', 'resume', 'school', 'field', 'course', 'location', 'start_date', 'end_date', 'description')
+        list_serializer_class = ResumeSectionListSerializer
 
 
-class LanguageSerializer(serializers.ModelSerializer):
+class LanguageSerializer(ResumeSectionSerializer):
     class Meta:
         model = Language
         fields = ('id', 'resume', 'name', 'level')
-
-    def create(self, validated_data):
-        # Check if resume creator is user logged in
-        resumeUser = Resume.objects.get(id = validated_data['resume'].id).user.id
-
-        if resumeUser == self.context['request'].user.id :
-            language = super().create(validated_data)
-            language.save()
-            return language
-        raise serializers.ValidationError("Access denied")
+        list_serializer_class = ResumeSectionListSerializer
 
 
 class FullResumeSerializer(serializers.ModelSerializer):
@@ -189,28 +229,22 @@ class FullResumeSerializer(serializers.ModelSerializer):
         fields = ('id', 'user', 'name', 'summary', 'work_experiences', 'academic_experiences', 'languages', 'other')
 
 
-class ApplicationSerializer(serializers.ModelSerializer):
+class ApplicationSerializer(OwnerStampedSerializer):
     class Meta:
         model = Application
         fields = ('id', 'user', 'opportunity', 'resume', 'timestamp', 'answer_1', 'answer_2', 'answer_3', 'answer_4', 'answer_5')
 
     def create(self, validated_data):
         # Check if user is the one who posted the opportunity
-        userDidPost = Opportunity.objects.filter(id = validated_data['opportunity'].id, user__id = self.context['request'].user.id)
-        if userDidPost:
+        if validated_data['opportunity'].user_id == self.context['request'].user.id:
             raise serializers.ValidationError("A user cannot apply to an opportunity they have created.")
 
-        # Check if user has already applied
-        instance = Application.objects.filter(user__id = self.context['request'].user.id, \
-            opportunity__id = validated_data['opportunity'].id)
-        if not instance :
-            application = super().create(validated_data)
-            user = User.objects.get(id = self.context['request'].user.id)
-            application.user = user
-            application.save()
-            return application
-        
-        raise serializers.ValidationError("Record already exists")
+        # A single INSERT, the (user, opportunity) unique constraint rejects repeated and concurrent applications
+        try:
+            with transaction.atomic():
+                return super().create(validated_data)
+        except IntegrityError:
+            raise Conflict("Record already exists")
 
 class FullApplicationSerializer(serializers.ModelSerializer):
     user = UserSerializer()
@@ -1,3 +1,482 @@
-from django.test import TestCase
+import asyncio
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, connections
+from django.http import HttpResponse, JsonResponse
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import path
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import views
+from .autocomplete import company_name_index
+from .caching import cache_stats, response_cache
+from .models import Application, CacheVersion, Company, CompanyQuestion, CompanyReview, Opportunity, User
+from .serializers import CompanyReviewSerializer
+from volunteer.asgi import application
+
+
+def api_client(user=None):
+    client = APIClient()
+    if user is not None:
+        client.force_authenticate(user)
+    return client
+
+
+def worker(name, **settings):
+    # A separate process' own local memory cache
+    return override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': name}}, **settings)
+
+
+def shared_cache():
+    # Stands in for memcached/redis: workers in this process using the same local memory cache
+    return worker('shared', RESPONSE_CACHE_TIMEOUT=300)
+
+
+class CompanyReviewTotalsTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='reviewer')
+        self.company = Company.objects.create(name='Company', industry='Health', description='-')
+        response = api_client(self.user).post(f'/api/company/{self.company.id}/reviews',
+            {'company': self.company.id, 'identification': '-', 'score': '3.0', 'review': '-'})
+        self.assertEqual(response.status_code, 201)
+        self.review = CompanyReview.objects.get()
+
+    def assertTotals(self, count, score):
+        self.company.refresh_from_db()
+        self.assertEqual((self.company.review_total_count, self.company.review_total_score), (count, Decimal(score)))
+
+    def test_update_subtracts_stored_score(self):
+        stale = CompanyReview.objects.get()
+        # Another edit commits after `stale` was loaded
+        api_client(self.user).patch(f'/api/company/{self.company.id}/review/{self.review.id}', {'score': '1.0'})
+        serializer = CompanyReviewSerializer(stale, data={'score': '4.0'}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        self.assertTotals(1, '4.0')
+
+    def test_delete_subtracts_stored_score(self):
+        api_client(self.user).patch(f'/api/company/{self.company.id}/review/{self.review.id}', {'score': '5.0'})
+        self.assertTotals(1, '5.0')
+        response = api_client(self.user).delete(f'/api/company/{self.company.id}/review/{self.review.id}')
+        self.assertEqual(response.status_code, 204)
+        self.assertTotals(0, '0')
+
+
+class ListIndexTests(TestCase):
+    # Every timestamp ordered list must be read off its (filter, -timestamp, -id) index, in page number and in
+    # keyset order, never sorted in a temporary B-tree
+
+    def setUp(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("Checks SQLite query plans")
+        self.user = User.objects.create(username='user')
+        company = Company.objects.create(name='Company', industry='Health', description='-')
+        opportunity = Opportunity.objects.create(user=self.user, company=company, position='-', location='-',
+            description='-', image_url='-')
+        question = CompanyQuestion.objects.create(company=company, user=self.user, question='-')
+        # (view, URL kwargs, requesting user, index)
+        self.cases = [
+            (views.OpportunityListView, {}, None, 'opportunity_active_only_ts_idx'),
+            (views.OpportunityListView, {}, self.user, 'opportunity_active_only_ts_idx'),
+            (views.OpportunitiesPostedView, {'user_id': self.user.id}, self.user, 'opportunity_user_ts_idx'),
+            (views.SavedOpportunitiesView, {'user_id': self.user.id}, self.user, 'saved_user_ts_idx'),
+            (views.OpportunitiesAppliedListView, {'user_id': self.user.id}, self.user, 'application_user_ts_idx'),
+            (views.ApplicationsView, {'opportunity_id': opportunity.id}, self.user, 'application_opp_ts_idx'),
+            (views.CompanyReviewListView, {'company_id': company.id}, None, 'review_company_ts_idx'),
+            (views.CompanyQuestionListView, {'company_id': company.id}, None, 'question_company_ts_idx'),
+            (views.CompanyAnswerListView, {'question_id': question.id}, None, 'answer_question_ts_idx'),
+        ]
+
+    def list_queryset(self, viewClass, kwargs, user):
+        request = APIRequestFactory().get('/')
+        if user is not None:
+            force_authenticate(request, user)
+        view = viewClass()
+        view.setup(request, **kwargs)
+        view.request = view.initialize_request(request)
+        return view.filter_queryset(view.get_queryset())
+
+    def test_list_queries_use_index(self):
+        for viewClass, kwargs, user, index in self.cases:
+            queryset = self.list_queryset(viewClass, kwargs, user)
+            # As listed, and in keyset pagination order
+            for ordered in (queryset, queryset.order_by('-timestamp', '-id')):
+                with self.subTest(view=viewClass.__name__, authenticated=user is not None):
+                    plan = ordered.explain()
+                    self.assertIn(f"USING INDEX {index}", plan)
+                    self.assertNotIn("USE TEMP B-TREE FOR ORDER BY", plan)
+
+
+class OpportunitySearchTests(TestCase):
+
+    def setUp(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("Checks SQLite full-text search")
+        user = User.objects.create(username='user')
+        company = Company.objects.create(name='Company', industry='Health', description='-')
+        Opportunity.objects.bulk_create([Opportunity(user=user, company=company, position=f'Volunteer {i}',
+            location='Lisbon', description='Help with the garden', image_url='-') for i in range(3000)])
+        self.best = Opportunity.objects.create(user=user, company=company, position='Helper', location='Lisbon',
+            description='-', image_url='-')
+        self.queryset = views.OpportunitySearchResultsView(kwargs={'opportunity_position': 'help',
+            'opportunity_location': 'blank'}).get_queryset()
+
+    def test_position_matches_rank_first(self):
+        self.assertEqual(self.queryset.count(), 3001)
+        self.assertEqual(self.queryset.first(), self.best)
+
+    def test_match_runs_once(self):
+        # Ranking in a subquery per row ran the MATCH again for every match, quadratic in the number of matches
+        self.assertEqual(self.queryset.explain().count("VIRTUAL TABLE"), 1)
+
+        start = time.monotonic()
+        response = api_client().get('/api/opportunitysearch/help/in/blank')
+        self.assertEqual(response.json()['results'][0]['id'], self.best.id)
+        self.assertLess(time.monotonic() - start, 1)
+
+
+class CompanyAutocompleteTests(TransactionTestCase):
+    # The local index is updated on commit
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            self.skipTest("Checks the in-process index")
+        # Rows flushed after other tests never reached the index
+        company_name_index.entries = None
+        for name in ('Future Bright Alliance 20', 'Open Bright Trust 25', 'Hope Foundation', 'Helping Hands'):
+            Company.objects.create(name=name, industry='Health', description='-')
+
+    def names(self, text):
+        return [company['name'] for company in api_client().get(f'/api/companyautocomplete/{text}').json()]
+
+    def test_typos_in_any_word(self):
+        self.assertEqual(self.names('Brigth'), ['Future Bright Alliance 20', 'Open Bright Trust 25'])
+        self.assertEqual(self.names('Brigt'), ['Future Bright Alliance 20', 'Open Bright Trust 25'])
+        self.assertEqual(self.names('Hpoe'), ['Hope Foundation'])
+        self.assertEqual(self.names('Bright Opne')[0], 'Open Bright Trust 25')
+        self.assertEqual(self.names('Aliance'), ['Future Bright Alliance 20'])
+        self.assertEqual(self.names('xyzzy'), [])
+
+    def test_writes_update_index_in_place(self):
+        self.assertEqual(self.names('Hope'), ['Hope Foundation'])
+        builtAt = company_name_index.builtAt
+        company = Company.objects.get(name='Hope Foundation')
+        company.name = 'Harbor Foundation'
+        company.save()
+        Company.objects.create(name='Hopeful Start', industry='Health', description='-')
+        self.assertEqual(self.names('Hope'), ['Hopeful Start'])
+        self.assertEqual(self.names('Harbor'), ['Harbor Foundation'])
+
+        company.delete()
+        self.assertEqual(self.names('Harbor'), [])
+        self.assertEqual(company_name_index.builtAt, builtAt)
+
+
+class IdempotentCreateTests(TransactionTestCase):
+
+    def setUp(self):
+        poster = User.objects.create(username='poster')
+        self.applicant = User.objects.create(username='applicant')
+        company = Company.objects.create(name='Company', industry='Health', description='-')
+        self.opportunity = Opportunity.objects.create(user=poster, company=company, position='-', location='-',
+            description='-', image_url='-')
+        self.url = f'/api/opportunity/{self.opportunity.id}/applications'
+
+    def apply(self):
+        return api_client(self.applicant).post(self.url, {'opportunity': self.opportunity.id, 'answer_1': 'Yes'},
+            HTTP_IDEMPOTENCY_KEY='key-1')
+
+    def test_concurrent_retry(self):
+        started, retried = threading.Event(), threading.Event()
+        createApplication = views.ApplicationsView.perform_create
+        responses = []
+
+        def slow_create(view, serializer):
+            started.set()
+            retried.wait(5)
+            createApplication(view, serializer)
+
+        def first_request():
+            try:
+                responses.append(self.apply())
+            finally:
+                connection.close()
+
+        with shared_cache(), mock.patch.object(views.ApplicationsView, 'perform_create', slow_create):
+            response_cache().clear()
+            thread = threading.Thread(target=first_request)
+            thread.start()
+            started.wait(5)
+            # Arrives while the first request is still creating
+            self.assertEqual(self.apply().status_code, 409)
+            retried.set()
+            thread.join()
+            self.assertEqual(responses[0].status_code, 201)
+
+            retry = self.apply()
+            self.assertEqual(retry.status_code, 201)
+            self.assertEqual(retry.json(), responses[0].json())
+        self.assertEqual(Application.objects.count(), 1)
+
+    def test_failure_is_not_stored(self):
+        with shared_cache():
+            response_cache().clear()
+            with mock.patch.object(views.ApplicationsView, 'perform_create', side_effect=ValidationError("Try again")):
+                self.assertEqual(self.apply().status_code, 400)
+            self.assertEqual(self.apply().status_code, 201)
+
+
+class AuthUserCacheTests(TransactionTestCase):
+
+    def setUp(self):
+        if settings.CACHE_SHARED:
+            self.skipTest("Checks the default without a shared cache")
+        self.user = User.objects.create(username='staff', is_staff=True)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+
+    def test_revoked_staff_seen_by_other_workers(self):
+        with worker('first'):
+            self.assertEqual(self.client.get('/api/jobstats').status_code, 200)
+        with worker('second'):
+            self.user.is_staff = False
+            self.user.save()
+        with worker('first'):
+            self.assertEqual(self.client.get('/api/jobstats').status_code, 403)
+
+
+class OpportunityOwnershipTests(TestCase):
+
+    def setUp(self):
+        self.poster = User.objects.create(username='poster')
+        self.other = User.objects.create(username='other')
+        company = Company.objects.create(name='Company', industry='Health', description='-')
+        self.opportunity = Opportunity.objects.create(user=self.poster, company=company, position='Tutor',
+            location='-', description='-', image_url='-')
+        self.url = f'/api/opportunity/{self.opportunity.id}'
+
+    def test_anyone_can_read(self):
+        self.assertEqual(api_client().get(self.url).status_code, 200)
+        self.assertEqual(api_client(self.other).get(self.url).status_code, 200)
+
+    def test_only_poster_can_edit(self):
+        self.assertEqual(api_client(self.other).patch(self.url, {'position': 'Taken'}).status_code, 404)
+        self.assertEqual(api_client(self.other).put(self.url, {'company': self.opportunity.company_id,
+            'position': 'Taken', 'location': '-', 'description': '-', 'image_url': '-'}).status_code, 404)
+        self.opportunity.refresh_from_db()
+        self.assertEqual(self.opportunity.position, 'Tutor')
+
+        self.assertEqual(api_client(self.poster).patch(self.url, {'position': 'Mentor'}).status_code, 200)
+        self.opportunity.refresh_from_db()
+        self.assertEqual(self.opportunity.position, 'Mentor')
+
+    def test_no_delete(self):
+        self.assertEqual(api_client(self.poster).delete(self.url).status_code, 405)
+
+
+class ConditionalGetTests(TransactionTestCase):
+    # Versions are bumped on commit
+
+    def setUp(self):
+        Company.objects.create(name='First', industry='Health', description='-')
+
+    def test_write_in_another_worker_changes_etag(self):
+        with worker('first'):
+            response = api_client().get('/api/companies')
+            etag = response['ETag']
+            self.assertEqual(api_client().get('/api/companies', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with worker('second'):
+            self.assertEqual(api_client().get('/api/companies', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            Company.objects.create(name='Second', industry='Health', description='-')
+        with worker('first'):
+            response = api_client().get('/api/companies', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+            self.assertContains(response, 'Second')
+
+
+class ResponseCacheTests(TransactionTestCase):
+
+    def setUp(self):
+        Company.objects.create(name='First', industry='Health', description='-')
+
+    def test_shared_cache_hits_until_write(self):
+        with shared_cache():
+            response_cache().clear()
+            first = api_client().get('/api/companies')
+            self.assertEqual(api_client().get('/api/companies').content, first.content)
+            self.assertEqual(cache_stats(['CompanyListView']), {'CompanyListView': {'hits': 1, 'misses': 1}})
+
+            Company.objects.create(name='Second', industry='Health', description='-')
+            self.assertContains(api_client().get('/api/companies'), 'Second')
+            self.assertEqual(cache_stats(['CompanyListView']), {'CompanyListView': {'hits': 1, 'misses': 2}})
+
+    def test_off_without_timeout(self):
+        with worker('first', RESPONSE_CACHE_TIMEOUT=0):
+            response_cache().clear()
+            api_client().get('/api/companies')
+            api_client().get('/api/companies')
+            self.assertEqual(cache_stats(['CompanyListView']), {'CompanyListView': {'hits': 0, 'misses': 0}})
+
+
+class UserFlagsTests(TransactionTestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='user')
+        company = Company.objects.create(name='Company', industry='Health', description='-')
+        self.opportunity = Opportunity.objects.create(user=self.user, company=company, position='-', location='-',
+            description='-', image_url='-')
+
+    def test_save_changes_etag(self):
+        client = api_client(self.user)
+        response = client.get('/api/opportunities')
+        self.assertFalse(response.json()['results'][0]['is_saved'])
+        etag = response['ETag']
+        self.assertEqual(client.get('/api/opportunities', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        response = client.post(f'/api/user/{self.user.id}/opportunitiessaved',
+            {'user': self.user.id, 'opportunity': self.opportunity.id})
+        self.assertEqual(response.status_code, 201)
+        response = client.get('/api/opportunities', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['results'][0]['is_saved'])
+
+        etag = response['ETag']
+        client.delete(f'/api/user/{self.user.id}/opportunitysaved/{self.opportunity.id}')
+        response = client.get('/api/opportunities', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()['results'][0]['is_saved'])
+
+
+def slow_view(request):
+    time.sleep(0.3)
+    return HttpResponse()
+
+
+def write_then_read_view(request):
+    before = list(Company.objects.values_list('name', flat=True))
+    Company.objects.filter(name='Primary').update(description='Read')
+    after = list(Company.objects.values_list('name', flat=True))
+    return JsonResponse({'before': before, 'after': after})
+
+
+urlpatterns = [path('slow', slow_view), path('writethenread', write_then_read_view)]
+
+
+async def asgi_get(path, headers=()):
+    # A GET through volunteer.asgi, returns the status and body
+    scope = {'type': 'http', 'method': 'GET', 'path': path, 'query_string': b'',
+        'headers': [(b'host', b'testserver'), *headers]}
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b''}
+
+    async def send(message):
+        messages.append(message)
+
+    await application(scope, receive, send)
+    return messages[0]['status'], b''.join(message.get('body', b'') for message in messages[1:])
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class AsgiConcurrencyTests(SimpleTestCase):
+
+    async def requests(self, count):
+        return await asyncio.gather(*(asgi_get('/slow') for i in range(count)))
+
+    def test_requests_run_concurrently(self):
+        # Sync middleware and views must not share one thread between requests
+        start = time.monotonic()
+        self.assertEqual(asyncio.run(self.requests(6)), [(200, b'')] * 6)
+        self.assertLess(time.monotonic() - start, 1.2)
+
+
+class AsgiStreamingTests(TransactionTestCase):
+    # Not a TestCase, ASGI requests run on other threads with their own connections
+
+    def test_export_streams_rows(self):
+        poster = User.objects.create(username='poster')
+        company = Company.objects.create(name='Company', industry='Health', description='-')
+        opportunity = Opportunity.objects.create(user=poster, company=company, position='-', location='-',
+            description='-', image_url='-')
+        for i in range(3):
+            Application.objects.create(user=User.objects.create(username=f'applicant{i}'), opportunity=opportunity)
+
+        token = RefreshToken.for_user(poster).access_token
+        status, body = asyncio.run(asgi_get(f'/api/opportunity/{opportunity.id}/applications/export/csv',
+            [(b'authorization', f"Bearer {token}".encode())]))
+        self.assertEqual(status, 200)
+        lines = body.decode().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertIn('applicant0', body.decode())
+
+
+@override_settings(DATABASE_ROUTERS=['api.replicas.ReplicaRouter'], REPLICA_DATABASES=['replica'],
+    REPLICA_PIN_SECONDS=1, MIDDLEWARE=settings.MIDDLEWARE + ['api.replicas.ReplicaRoutingMiddleware'])
+class ReplicaRoutingTests(TransactionTestCase):
+    # The replica is a separate database that stopped replicating, so responses show where they were read.
+    # Not a TestCase, whose transaction keeps every read on the primary
+
+    @classmethod
+    def setUpClass(cls):
+        # Added here rather than to databases, which the test runner would try to create
+        connections.databases['replica'] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}
+        call_command('migrate', database='replica', verbosity=0)
+        cls.databases = {'default', 'replica'}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        del connections['replica']
+        del connections.databases['replica']
+
+    def setUp(self):
+        self.user = User.objects.create(username='user')
+        company = Company.objects.create(name='Primary', industry='Health', description='-')
+        self.opportunity = Opportunity.objects.create(user=self.user, company=company, position='-', location='-',
+            description='-', image_url='-')
+        Company.objects.using('replica').create(name='Replica', industry='Health', description='-')
+        # Flushing skips the replica, where the router allows no tables
+        self.addCleanup(Company.objects.using('replica').all().delete)
+        # Versions bumped long ago, so the list views don't read the primary for fresh data
+        CacheVersion.objects.update(modified=timezone.now() - timedelta(hours=1))
+
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+
+    def test_safe_get_reads_replica(self):
+        with worker('replica-pins'):
+            self.assertContains(self.client.get('/api/companies'), 'Replica')
+            self.assertContains(APIClient().get('/api/companies'), 'Replica')
+
+    def test_write_pins_user_to_primary(self):
+        with worker('replica-pins'):
+            response_cache().clear()
+            response = self.client.post(f'/api/user/{self.user.id}/opportunitiessaved',
+                {'user': self.user.id, 'opportunity': self.opportunity.id})
+            self.assertEqual(response.status_code, 201)
+            self.assertContains(self.client.get('/api/companies'), 'Primary')
+            self.assertContains(APIClient().get('/api/companies'), 'Replica')
+
+            time.sleep(settings.REPLICA_PIN_SECONDS + 0.1)
+            self.assertContains(self.client.get('/api/companies'), 'Replica')
+
+    @override_settings(ROOT_URLCONF=__name__)
+    def test_reads_after_write_use_primary(self):
+        with worker('replica-pins'):
+            response = self.client.get('/writethenread')
+        self.assertEqual(response.json(), {'before': ['Replica'], 'after': ['Primary']})
+        self.assertTrue(Company.objects.filter(name='Primary', description='Read').exists())
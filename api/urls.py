@@ -9,10 +9,10 @@ urlpatterns = [
     path("user/<int:user_id>", views.UpdateCurrentUserView.as_view(), name="user_update"),
 
     # Opportunity
-    path("opportunities", views.OpportunityListView.as_view(), name="opportunities"),
+    path("opportunities", views.read_view(views.OpportunityListView.as_view()), name="opportunities"),
     path("opportunity/<int:opportunity_id>", views.OpportunityDetailsView.as_view(), name="single_opportunity"),
     path("opportunitysearch/<str:opportunity_position>/in/<str:opportunity_location>", \
-        views.OpportunitySearchResultsView.as_view(), name="opportunity_search_results"),
+        views.read_view(views.OpportunitySearchResultsView.as_view()), name="opportunity_search_results"),
 
     # Saved
     path("user/<int:user_id>/opportunitiessaved", views.SavedOpportunitiesView.as_view(), name="saved_opportunities"),
@@ -29,12 +29,16 @@ urlpatterns = [
         
     # Applications
     path("opportunity/<int:opportunity_id>/applications", views.ApplicationsView.as_view(), name="applications"),
+    path("opportunity/<int:opportunity_id>/applications/export/<str:export_format>", views.ApplicationsExportView.as_view(), \
+        name="applications_export"),
     path("application/<int:application_id>", views.SingleApplicationView.as_view(), name="single_application"),
 
     # Company
-    path("companies", views.CompanyListView.as_view(), name="companies"),
-    path("company/<int:company_id>", views.CompanyDetailsView.as_view(), name="single_company"),
+    path("companies", views.read_view(views.CompanyListView.as_view()), name="companies"),
+    path("company/<int:company_id>", views.read_view(views.CompanyDetailsView.as_view()), name="single_company"),
+    path("company/<int:company_id>/page", views.read_view(views.CompanyPageView.as_view()), name="company_page"),
     path("companysearch/<str:company_name>", views.CompanySearchResultsView.as_view(), name="company_search_results"),
+    path("companyautocomplete/<str:company_name>", views.CompanyAutocompleteView.as_view(), name="company_autocomplete"),
 
     # Resumes
     path("user/<int:user_id>/resumes", views.ResumeListView.as_view(), name="resume_list"),
@@ -59,9 +63,10 @@ urlpatterns = [
     path("application/<int:application_id>/resume/<int:resume_id>/workexperiences", views.WorkExperienceListRecruiterView.as_view(), name="work_experience_list_recruiter"),
     path("application/<int:application_id>/resume/<int:resume_id>/academicexperiences", views.AcademicExperienceListRecruiterView.as_view(), name="academic_experience_list_recruiter"),
     path("application/<int:application_id>/resume/<int:resume_id>/languages", views.LanguageListRecruiterView.as_view(), name="language_list_recruiter"),
+    path("opportunity/<int:opportunity_id>/resumes", views.ApplicantResumesView.as_view(), name="applicant_resumes"),
 
     # Company Reviews
-    path("company/<int:company_id>/reviews", views.CompanyReviewListView.as_view(), name="company_reviews"),
+    path("company/<int:company_id>/reviews", views.read_view(views.CompanyReviewListView.as_view()), name="company_reviews"),
     path("company/<int:company_id>/review/<int:review_id>", views.SingleCompanyReviewView.as_view(), name="single_company_review"),
 
     # Company Questions
@@ -72,4 +77,13 @@ urlpatterns = [
     # Company Answers
     path("question/<int:question_id>/answers", views.CompanyAnswerListView.as_view(), name="company_answers"),
     path("question/<int:question_id>/answer/<int:answer_id>", views.SingleCompanyAnswerView.as_view(), name="single_company_answer"),
+
+    # Response cache
+    path("cachestats", views.ResponseCacheStatsView.as_view(), name="response_cache_stats"),
+
+    # Background jobs
+    path("jobstats", views.JobStatsView.as_view(), name="job_stats"),
+
+    # Metrics
+    path("metrics", views.metrics, name="metrics"),
 ]
\ No newline at end of file
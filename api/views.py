@@ -1,14 +1,37 @@
-from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
-from rest_framework import generics
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from functools import wraps
+from hashlib import md5
+
+from rest_framework.permissions import SAFE_METHODS, IsAdminUser, IsAuthenticated, IsAuthenticatedOrReadOnly
+from asgiref.sync import sync_to_async
+from rest_framework import generics, status
+from rest_framework.views import APIView
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
-from django.db.models import F
-from django.http import Http404
+from rest_framework.utils.urls import replace_query_param
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Prefetch, Q
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare
+from django.utils.dateparse import parse_datetime
 
 from .serializers import FullResumeSerializer, FullApplicationSerializer, CompanySerializer, CompanyQuestionSerializer, \
-    UserSerializer, OpportunitySerializer, SavedOpportunitiesSerializer, SavedOpportunitiesExpandedSerializer, \
-    CompanyReviewSerializer, CompanyAnswerSerializer, UserCreationSerializer, ResumeSerializer, WorkExperienceSerializer, \
-    AcademicExperienceSerializer, LanguageSerializer, ApplicationSerializer, FullApplicationSerializer, AppliedListSerializer
+    UserSerializer, OpportunitySerializer, OpportunityUserFlagsSerializer, SavedOpportunitiesSerializer, \
+    SavedOpportunitiesExpandedSerializer, CompanyReviewSerializer, CompanyAnswerSerializer, UserCreationSerializer, \
+    ResumeSerializer, WorkExperienceSerializer, AcademicExperienceSerializer, LanguageSerializer, ApplicationSerializer, \
+    FullApplicationSerializer, AppliedListSerializer, Conflict
+from .autocomplete import autocomplete_companies
+from .caching import CachedResponseMixin, ConditionalGetMixin, VersionedViewMixin, cache_stats, response_cache
+from .exports import stream_csv, stream_ndjson
+from .fast_serializers import values_serializer
+from .jobs import queue_stats
+from .metrics import request_metrics
+from .search import search_opportunities
 from .models import Application, CompanyQuestion, User, Company, Opportunity, Saved, CompanyReview, CompanyAnswer, \
     Resume, WorkExperience, AcademicExperience, Language
 
@@ -26,6 +49,179 @@ class CustomShortPagination(PageNumberPagination):
     max_page_size = 20
 
 
+class TimestampCursorMixin:
+    """
+    Opt-in keyset pagination on (timestamp, id), newest first. Requests that send a `cursor` parameter (empty for
+    the first page) get {next, results} pages without COUNT or OFFSET, any other request is paginated by page number.
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def encode_cursor(self, instance):
+        # Model instance, or a values() row on the fast list path
+        if isinstance(instance, dict):
+            timestamp, id = instance['timestamp'], instance['id']
+        else:
+            timestamp, id = instance.timestamp, instance.id
+        position = f"{timestamp.isoformat()}|{id}"
+        return urlsafe_b64encode(position.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            timestamp, id = urlsafe_b64decode(cursor.encode()).decode().split('|')
+            timestamp = parse_datetime(timestamp)
+            if timestamp is None:
+                raise ValueError
+            return timestamp, int(id)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.cursor_query_param in request.query_params
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        pageSize = self.get_page_size(request)
+        queryset = queryset.order_by('-timestamp', '-id')
+        cursor = request.query_params[self.cursor_query_param]
+        if cursor:
+            timestamp, id = self.decode_cursor(cursor)
+            queryset = queryset.filter(Q(timestamp__lt = timestamp) | Q(timestamp = timestamp, id__lt = id))
+
+        page = list(queryset[:pageSize + 1])
+        self.next_cursor = self.encode_cursor(page[pageSize - 1]) if len(page) > pageSize else None
+        return page[:pageSize]
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data)
+        ]))
+
+
+class TimestampCursorLongPagination(TimestampCursorMixin, CustomLongPagination):
+    pass
+
+
+class TimestampCursorShortPagination(TimestampCursorMixin, CustomShortPagination):
+    pass
+
+
+# Async serving
+
+def read_view(view):
+    """
+    Under ASGI (settings.ASYNC_READ_VIEWS) serves safe methods from a thread pool instead of Django's single
+    thread for sync views, so concurrent reads wait on the database in parallel. Writes keep running on the
+    thread-sensitive executor. Under WSGI the view is returned unchanged.
+    """
+    if not settings.ASYNC_READ_VIEWS:
+        return view
+
+    def run(request, *args, **kwargs):
+        try:
+            response = view(request, *args, **kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+            return response
+        finally:
+            # Pool threads keep their own connections, close them per CONN_MAX_AGE like request_finished does
+            close_old_connections()
+
+    @wraps(view)
+    async def async_view(request, *args, **kwargs):
+        threadSensitive = request.method not in SAFE_METHODS
+        return await sync_to_async(run, thread_sensitive=threadSensitive)(request, *args, **kwargs)
+
+    return async_view
+
+
+# Fast list serialization
+
+class FastListMixin:
+    """
+    Read-only list GETs (settings.FAST_LIST_SERIALIZERS) fetch values() rows and serialize them with a plan
+    compiled from the serializer class, see fast_serializers. The JSON is the same as the serializer's.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if not settings.FAST_LIST_SERIALIZERS:
+            return super().list(request, *args, **kwargs)
+
+        fast = values_serializer(self.get_serializer_class())
+        queryset = fast.rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(fast.to_representation(page))
+        return Response(fast.to_representation(queryset))
+
+
+# Authorization
+
+class OwnedObjectMixin:
+    """
+    Detail views of objects owned by the logged in user. Ownership is resolved in the query that fetches the
+    object, owner_fields being lookups to the owning user (e.g. 'resume__user'), any of which grants access.
+    Objects that don't exist or aren't owned both give a 404. get_owner_fields() returning None leaves the object
+    open to everyone (e.g. public reads).
+    """
+    owner_fields = ('user',)
+
+    def get_owner_fields(self):
+        return self.owner_fields
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        ownerFields = self.get_owner_fields()
+        if ownerFields is None:
+            return queryset
+        if not self.request.user.is_authenticated:
+            return queryset.none()
+        ownership = Q()
+        for field in ownerFields:
+            ownership |= Q(**{f"{field}__id": self.request.user.id})
+        return queryset.filter(ownership)
+
+
+# Response cache
+
+class ResponseCacheStatsView(generics.GenericAPIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(cache_stats(['OpportunityListView', 'CompanyListView', 'CompanyDetailsView', 'CompanyPageView',
+            'CompanyReviewListView']))
+
+
+# Background jobs
+
+class JobStatsView(generics.GenericAPIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(queue_stats())
+
+
+# Metrics
+
+def metrics(request):
+    # Prometheus scrape target, the scraper sends settings.METRICS_TOKEN as a bearer token
+    token = settings.METRICS_TOKEN
+    if not token or not constant_time_compare(request.headers.get('Authorization', ''), f"Bearer {token}"):
+        raise Http404
+    return HttpResponse(request_metrics.render_text(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 # Users
 
 class UserListView(generics.CreateAPIView):
@@ -54,8 +250,9 @@ class UpdateCurrentUserView(generics.UpdateAPIView):
 
 # Companies
 
-class CompanyListView(generics.ListCreateAPIView):
+class CompanyListView(ConditionalGetMixin, CachedResponseMixin, FastListMixin, generics.ListCreateAPIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
+    cache_versions = ('company', 'companyreview')
     queryset = Company.objects.all().order_by('name')
     serializer_class = CompanySerializer
     pagination_class = CustomLongPagination
@@ -66,8 +263,9 @@ class CompanyListView(generics.ListCreateAPIView):
         return super().paginate_queryset(queryset)
 
 
-class CompanyDetailsView(generics.RetrieveUpdateDestroyAPIView):
+class CompanyDetailsView(ConditionalGetMixin, CachedResponseMixin, generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
+    cache_versions = ('company:{company_id}',)
     serializer_class = CompanySerializer
     lookup_url_kwarg = 'company_id'
 
@@ -75,7 +273,7 @@ class CompanyDetailsView(generics.RetrieveUpdateDestroyAPIView):
         return Company.objects.filter(pk = self.kwargs['company_id'])
 
 
-class CompanySearchResultsView(generics.ListAPIView):
+class CompanySearchResultsView(FastListMixin, generics.ListAPIView):
     serializer_class = CompanySerializer
     pagination_class = CustomLongPagination
 
@@ -84,42 +282,80 @@ class CompanySearchResultsView(generics.ListAPIView):
         return Company.objects.filter(name__icontains = name)
 
 
+class CompanyAutocompleteView(generics.ListAPIView):
+    serializer_class = CompanySerializer
+
+    def get_queryset(self):
+        name = self.kwargs['company_name'] if self.kwargs['company_name'] != "blank" else ""
+        try:
+            limit = min(int(self.request.query_params.get('limit', 10)), 20)
+        except ValueError:
+            limit = 10
+        return autocomplete_companies(name, max(limit, 1))
+
+
 # Opportunities
 
-class OpportunityListView(generics.ListCreateAPIView):
+class OpportunityUserFlagsMixin(VersionedViewMixin):
+    """
+    Authenticated list GETs include the user's is_saved, has_applied and saved_id for every opportunity,
+    annotated on the list query, and depend on the user's flags version. Anonymous responses (the cached ones) are
+    unchanged.
+    """
+
+    def flags_requested(self):
+        return self.request.method == 'GET' and self.request.user.is_authenticated
+
+    def get_cache_versions(self):
+        versions = super().get_cache_versions()
+        if self.flags_requested():
+            versions.append(f"user:{self.request.user.id}:flags")
+        return versions
+
+    def filter_queryset(self, queryset):
+        # Applied on top of whatever get_queryset() the view defines
+        queryset = super().filter_queryset(queryset)
+        if self.flags_requested():
+            queryset = queryset.with_user_flags(self.request.user.id)
+        return queryset
+
+    def get_serializer_class(self):
+        if self.flags_requested():
+            return OpportunityUserFlagsSerializer
+        return super().get_serializer_class()
+
+
+class OpportunityListView(ConditionalGetMixin, CachedResponseMixin, FastListMixin, OpportunityUserFlagsMixin,
+        generics.ListCreateAPIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
-    queryset = Opportunity.objects.all().filter(is_active = True).order_by('-timestamp')
+    cache_versions = ('opportunity', 'company')
+    queryset = Opportunity.objects.for_listing().filter(is_active = True).order_by('-timestamp')
     serializer_class = OpportunitySerializer
-    pagination_class = CustomLongPagination
+    pagination_class = TimestampCursorLongPagination
 
 
-class OpportunityDetailsView(generics.RetrieveUpdateAPIView):
+class OpportunityDetailsView(ConditionalGetMixin, OwnedObjectMixin, generics.RetrieveUpdateAPIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
+    cache_versions = ('opportunity', 'company')
+    queryset = Opportunity.objects.for_listing()
     serializer_class = OpportunitySerializer
     lookup_url_kwarg = 'opportunity_id'
 
-    def get_queryset(self):
-        return Opportunity.objects.filter(id = self.kwargs['opportunity_id'])
-
-    def destroy(self, request, *args, **kwargs):
-        checkRecord = Opportunity.objects.get(id = self.kwargs['opportunity_id'])
-
-        # Check if record exists and logged in user.id is the one that created the listing
-        if checkRecord and checkRecord.user.id == self.request.user.id :
-            self.perform_destroy(Opportunity.objects.filter(id = self.kwargs['opportunity_id']))
-            return Response(status=204)
-        else:
-            raise Http404        
+    def get_owner_fields(self):
+        # Anyone can read an opportunity, only its poster can edit it
+        if self.request.method in SAFE_METHODS:
+            return None
+        return ('user',)
 
 
-class OpportunitySearchResultsView(generics.ListAPIView):
+class OpportunitySearchResultsView(FastListMixin, OpportunityUserFlagsMixin, generics.ListAPIView):
     serializer_class = OpportunitySerializer
     pagination_class = CustomLongPagination
 
     def get_queryset(self):
         position = self.kwargs['opportunity_position'] if self.kwargs['opportunity_position'] != "blank" else ""
         location = self.kwargs['opportunity_location'] if self.kwargs['opportunity_location'] != "blank" else ""
-        return Opportunity.objects.filter(position__icontains = position, location__icontains = location)
+        return search_opportunities(Opportunity.objects.for_listing().filter(is_active = True), position, location)
 
 
 # Saved
@@ -128,7 +364,7 @@ class SavedOpportunitiesView(generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
     lookup_field = 'user'
     lookup_url_kwarg = 'user_id'
-    pagination_class = CustomLongPagination
+    pagination_class = TimestampCursorLongPagination
 
     def get_serializer_class(self):
         if self.request.method == 'GET':
@@ -137,7 +373,8 @@ class SavedOpportunitiesView(generics.ListCreateAPIView):
 
     def get_queryset(self):
         if self.kwargs['user_id'] == self.request.user.id :            
-            return Saved.objects.filter(user__id = self.kwargs['user_id']).order_by('-timestamp')
+            return Saved.objects.filter(user__id = self.kwargs['user_id']).order_by('-timestamp')\
+                .prefetch_related(Prefetch('opportunity', queryset=Opportunity.objects.for_listing()))
         else:
             raise Http404
 
@@ -161,11 +398,12 @@ class OpportunitiesAppliedListView(generics.ListAPIView):
     serializer_class = AppliedListSerializer
     lookup_url_kwarg = 'user_id'
     lookup_field = 'user__id'
-    pagination_class = CustomLongPagination
+    pagination_class = TimestampCursorLongPagination
 
     def get_queryset(self):
         if self.kwargs['user_id'] == self.request.user.id :            
-            return Application.objects.filter(user__id = self.kwargs['user_id']).order_by('-timestamp')
+            return Application.objects.filter(user__id = self.kwargs['user_id']).order_by('-timestamp')\
+                .prefetch_related(Prefetch('opportunity', queryset=Opportunity.objects.for_listing()))
         else:
             raise Http404
 
@@ -177,14 +415,15 @@ class SingleAppliedOpportunityView(generics.RetrieveDestroyAPIView):
     def get_queryset(self):
         if self.kwargs['user_id'] == self.request.user.id :
             return Application.objects.filter(opportunity__id = self.kwargs['opportunity_id'], \
-                user__id = self.request.user.id)
+                user__id = self.request.user.id)\
+                .prefetch_related(Prefetch('opportunity', queryset=Opportunity.objects.for_listing()))
         else:
             raise Http404
 
 
 # Posted
 
-class OpportunitiesPostedView(generics.ListAPIView):
+class OpportunitiesPostedView(FastListMixin, generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = OpportunitySerializer
     lookup_url_kwarg = 'user_id'
@@ -193,85 +432,129 @@ class OpportunitiesPostedView(generics.ListAPIView):
 
     def get_queryset(self):
         if self.kwargs['user_id'] == self.request.user.id :            
-            return Opportunity.objects.filter(user__id = self.kwargs['user_id']).order_by('-timestamp')
+            return Opportunity.objects.for_listing().filter(user__id = self.kwargs['user_id']).order_by('-timestamp')
         else:
             raise Http404
 
 
 # Company Reviews
 
-class CompanyReviewListView(generics.ListCreateAPIView):
+class CompanyReviewListView(ConditionalGetMixin, CachedResponseMixin, FastListMixin, generics.ListCreateAPIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
+    cache_versions = ('company:{company_id}',)
     serializer_class = CompanyReviewSerializer
     lookup_url_kwarg = 'company_id'
-    pagination_class = CustomShortPagination
+    pagination_class = TimestampCursorShortPagination
 
     def get_queryset(self):
         return CompanyReview.objects.filter(company__id = self.kwargs['company_id']).order_by('-timestamp')
 
 
-class SingleCompanyReviewView(generics.RetrieveUpdateDestroyAPIView):
+class SingleCompanyReviewView(OwnedObjectMixin, generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
+    queryset = CompanyReview.objects.all()
     serializer_class = CompanyReviewSerializer
     lookup_url_kwarg = 'review_id'
 
-    def get_queryset(self):
-        posterId = CompanyReview.objects.get(id = self.kwargs['review_id']).user.id
-        if posterId == self.request.user.id :            
-            return CompanyReview.objects.filter(id = self.kwargs['review_id'])
-        else:
-            raise Http404  
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        # Locked like CompanyReviewSerializer.update, subtracting what is stored rather than what was loaded
+        stored = CompanyReview.objects.select_for_update().filter(pk = instance.pk)\
+            .values('company_id', 'score').first()
+        if stored is None:
+            raise Http404
+        instance.delete()
+        Company.adjust_review_totals(stored['company_id'], -1, -stored['score'])
 
 
 # Company Questions
 
-class CompanyQuestionListView(generics.ListCreateAPIView):
+class CompanyQuestionListView(ConditionalGetMixin, generics.ListCreateAPIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
+    cache_versions = ('company:{company_id}:questions',)
     serializer_class = CompanyQuestionSerializer
     lookup_url_kwarg = 'company_id'
-    pagination_class = CustomShortPagination
+    pagination_class = TimestampCursorShortPagination
 
     def get_queryset(self):
         return CompanyQuestion.objects.filter(company__id = self.kwargs['company_id']).order_by('-timestamp')
 
 
-class SingleCompanyQuestionView(generics.RetrieveUpdateDestroyAPIView):
+class SingleCompanyQuestionView(OwnedObjectMixin, generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
+    queryset = CompanyQuestion.objects.all()
     serializer_class = CompanyQuestionSerializer
     lookup_url_kwarg = 'question_id'
 
-    def get_queryset(self):
-        posterId = CompanyQuestion.objects.get(id = self.kwargs['question_id']).user.id
-        if posterId == self.request.user.id :            
-            return CompanyQuestion.objects.filter(id = self.kwargs['question_id'])
-        else:
-            raise Http404
-
 
 # Company Answers
 
-class CompanyAnswerListView(generics.ListCreateAPIView):
+class CompanyAnswerListView(ConditionalGetMixin, generics.ListCreateAPIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
+    cache_versions = ('question:{question_id}:answers',)
     serializer_class = CompanyAnswerSerializer
     lookup_url_kwarg = 'question_id'
-    pagination_class = CustomShortPagination
+    pagination_class = TimestampCursorShortPagination
 
     def get_queryset(self):
         return CompanyAnswer.objects.filter(company_question__id = self.kwargs['question_id']).order_by('-timestamp')
 
 
 
-class SingleCompanyAnswerView(generics.RetrieveUpdateDestroyAPIView):
+class SingleCompanyAnswerView(OwnedObjectMixin, generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
+    queryset = CompanyAnswer.objects.all()
     serializer_class = CompanyAnswerSerializer
     lookup_url_kwarg = 'answer_id'
 
-    def get_queryset(self):
-        posterId = CompanyAnswer.objects.get(id = self.kwargs['answer_id']).user.id
-        if posterId == self.request.user.id :            
-            return CompanyAnswer.objects.filter(id = self.kwargs['answer_id'])
-        else:
-            raise Http404
+
+# Company page
+
+class CompanyPageView(ConditionalGetMixin, CachedResponseMixin, generics.RetrieveAPIView):
+    """
+    A company with the first page of its reviews and of its questions, each question embedding the first page of
+    its answers, in 4 queries. Every section has the cursor link of the list endpoint that continues it.
+    """
+    permission_classes = [IsAuthenticatedOrReadOnly]
+    cache_versions = ('company:{company_id}', 'company:{company_id}:questions', 'company:{company_id}:answers')
+    queryset = Company.objects.all()
+    serializer_class = CompanySerializer
+    lookup_url_kwarg = 'company_id'
+    pagination_class = TimestampCursorShortPagination
+
+    def section(self, rows, pageSize, serializerClass, urlName, **kwargs):
+        # rows holds up to pageSize + 1 rows, newest first, one more means there's a next page
+        nextLink = None
+        if len(rows) > pageSize:
+            url = self.request.build_absolute_uri(reverse(urlName, kwargs=kwargs))
+            nextLink = replace_query_param(url, self.paginator.cursor_query_param,
+                self.paginator.encode_cursor(rows[pageSize - 1]))
+        return OrderedDict([
+            ('next', nextLink),
+            ('results', serializerClass(rows[:pageSize], many=True, context=self.get_serializer_context()).data)
+        ])
+
+    def retrieve(self, request, *args, **kwargs):
+        company = self.get_object()
+        pageSize = self.paginator.get_page_size(request)
+        newestFirst = ('-timestamp', '-id')
+
+        reviews = list(CompanyReview.objects.filter(company__id = company.id).order_by(*newestFirst)[:pageSize + 1])
+        questions = list(CompanyQuestion.objects.filter(company__id = company.id).order_by(*newestFirst)\
+            .with_latest_answers(pageSize + 1)[:pageSize + 1])
+
+        questionSection = self.section(questions, pageSize, CompanyQuestionSerializer, 'company_questions',
+            company_id = company.id)
+        for question, data in zip(questions, questionSection['results']):
+            data['answers'] = self.section(question.latest_answers, pageSize, CompanyAnswerSerializer,
+                'company_answers', question_id = question.id)
+
+        return Response(OrderedDict([
+            ('company', self.get_serializer(company).data),
+            ('reviews', self.section(reviews, pageSize, CompanyReviewSerializer, 'company_reviews',
+                company_id = company.id)),
+            ('questions', questionSection),
+        ]))
 
 
 # Resumes
@@ -289,8 +572,9 @@ class ResumeListView(generics.ListCreateAPIView):
             raise Http404
 
 
-class SingleResumeView(generics.RetrieveUpdateDestroyAPIView):
+class SingleResumeView(OwnedObjectMixin, generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
+    queryset = Resume.objects.all()
     lookup_url_kwarg = 'resume_id'
     serializer_class = ResumeSerializer
 
@@ -299,34 +583,71 @@ class SingleResumeView(generics.RetrieveUpdateDestroyAPIView):
     #         return FullResumeSerializer
     #     return ResumeSerializer
 
+class SingleResumeRecruiterView(generics.RetrieveAPIView):
+    permission_classes = [IsAuthenticated]
+    serializer_class = FullResumeSerializer
+    lookup_url_kwarg = 'resume_id'
+
     def get_queryset(self):
-        resumeUser = Resume.objects.get(id = self.kwargs['resume_id']).user.id
+        # Resume owner, or poster of the opportunity the resume was sent to, authorized in the same query
+        return Resume.objects.with_sections().filter(
+            Q(user__id = self.request.user.id) |
+            Q(application_resume__id = self.kwargs['application_id'],
+                application_resume__opportunity__user__id = self.request.user.id)
+        ).distinct()
 
-        if resumeUser == self.request.user.id:
-            return Resume.objects.filter(id = self.kwargs['resume_id'])
-        else:
-            raise Http404
 
-class SingleResumeRecruiterView(generics.RetrieveAPIView):
+class ApplicantResumesView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = FullResumeSerializer
-    lookup_url_kwarg = 'resume_id'
 
     def get_queryset(self):
-        opportunityId = Application.objects.get(id = self.kwargs['application_id']).opportunity.id
-        posterId = Opportunity.objects.get(id = opportunityId).user.id
+        # Every resume sent to one of the logged in user's opportunities
+        return Resume.objects.with_sections().filter(application_resume__opportunity__id = self.kwargs['opportunity_id'],
+            application_resume__opportunity__user__id = self.request.user.id).distinct().order_by('id')
 
-        resumeUserId = Resume.objects.get(id = self.kwargs['resume_id']).user.id
 
-        if posterId == self.request.user.id or resumeUserId == self.request.user.id:
-            return Resume.objects.filter(id = self.kwargs['resume_id'])
-        else:
+# Resumes - Sections
+
+class ResumeSectionBulkMixin:
+    """
+    List payloads on POST add every item at once and PUT replaces the whole section. Ownership of the resume is
+    checked once and the rows are written with a single bulk INSERT inside one transaction.
+    """
+
+    def get_resume(self):
+        resume = Resume.objects.filter(id = self.kwargs['resume_id'], user__id = self.request.user.id).first()
+        if resume is None:
             raise Http404
+        return resume
+
+    def get_bulk_serializer(self, request):
+        if not isinstance(request.data, list):
+            raise ValidationError("Expected a list of items")
+        context = self.get_serializer_context()
+        context['resume'] = self.get_resume()
+        serializer = self.get_serializer_class()(data=request.data, many=True, context=context)
+        serializer.is_valid(raise_exception=True)
+        return serializer
+
+    def create(self, request, *args, **kwargs):
+        if not isinstance(request.data, list):
+            return super().create(request, *args, **kwargs)
+        serializer = self.get_bulk_serializer(request)
+        with transaction.atomic():
+            serializer.save()
+        return Response(serializer.data, status=201)
+
+    def put(self, request, *args, **kwargs):
+        serializer = self.get_bulk_serializer(request)
+        with transaction.atomic():
+            serializer.replace()
+        return Response(serializer.data)
 
 
 # Resumes - Work Experience
 
-class WorkExperienceListView(generics.ListCreateAPIView):
+class WorkExperienceListView(ResumeSectionBulkMixin, generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = WorkExperienceSerializer
     lookup_url_kwarg = 'resume_id'
@@ -358,24 +679,17 @@ class WorkExperienceListRecruiterView(generics.ListAPIView):
             raise Http404
 
 
-class SingleWorkExperienceView(generics.RetrieveUpdateDestroyAPIView):
+class SingleWorkExperienceView(OwnedObjectMixin, generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
+    queryset = WorkExperience.objects.all()
+    owner_fields = ('resume__user',)
     serializer_class = WorkExperienceSerializer
     lookup_url_kwarg = 'work_experience_id'
 
-    def get_queryset(self):
-        resumeId = WorkExperience.objects.get(id = self.kwargs['work_experience_id']).resume.id
-        resumeCreatorId = Resume.objects.get(id = resumeId).user.id
-        
-        if resumeCreatorId == self.request.user.id :
-            return WorkExperience.objects.filter(id = self.kwargs['work_experience_id'])
-        else:
-            raise Http404
-
 
 # Resumes - Academic Experience
 
-class AcademicExperienceListView(generics.ListCreateAPIView):
+class AcademicExperienceListView(ResumeSectionBulkMixin, generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = AcademicExperienceSerializer
     lookup_url_kwarg = 'resume_id'
@@ -410,24 +724,17 @@ class AcademicExperienceListRecruiterView(generics.ListCreateAPIView):
 
 
 
-class SingleAcademicExperienceView(generics.RetrieveUpdateDestroyAPIView):
+class SingleAcademicExperienceView(OwnedObjectMixin, generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
+    queryset = AcademicExperience.objects.all()
+    owner_fields = ('resume__user',)
     serializer_class = AcademicExperienceSerializer
     lookup_url_kwarg = 'academic_experience_id'
 
-    def get_queryset(self):
-        resumeId = AcademicExperience.objects.get(id = self.kwargs['academic_experience_id']).resume.id
-        resumeCreatorId = Resume.objects.get(id = resumeId).user.id
-        
-        if resumeCreatorId == self.request.user.id :
-            return AcademicExperience.objects.filter(id = self.kwargs['academic_experience_id'])
-        else:
-            raise Http404
-
 
 # Resumes - Language Experience
 
-class LanguageListView(generics.ListCreateAPIView):
+class LanguageListView(ResumeSectionBulkMixin, generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = LanguageSerializer
     lookup_url_kwarg = 'resume_id'
@@ -457,24 +764,53 @@ class LanguageListRecruiterView(generics.ListCreateAPIView):
             raise Http404
 
 
-class SingleLanguageView(generics.RetrieveUpdateDestroyAPIView):
+class SingleLanguageView(OwnedObjectMixin, generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
+    queryset = Language.objects.all()
+    owner_fields = ('resume__user',)
     serializer_class = LanguageSerializer
     lookup_url_kwarg = 'language_id'
 
-    def get_queryset(self):
-        resumeId = Language.objects.get(id = self.kwargs['language_id']).resume.id
-        resumeCreatorId = Resume.objects.get(id = resumeId).user.id
-        
-        if resumeCreatorId == self.request.user.id :
-            return Language.objects.filter(id = self.kwargs['language_id'])
-        else:
-            raise Http404
-
 
 # Applications
 
-class ApplicationsView(generics.ListCreateAPIView):
+class IdempotentCreateMixin:
+    """
+    POSTs carrying an Idempotency-Key header are performed once per user and key, retries get the stored response.
+    The key is reserved before the create, so a retry arriving while it runs gets a 409, and only a successful
+    response is stored, a failed create can be retried with the same key. Keys are kept in the response cache,
+    which must be shared (CACHE_SHARED) for retries that reach another worker, see checks.py.
+    """
+    idempotency_timeout = 60 * 60 * 24
+    # Until a request that never finished releases its key
+    idempotency_pending_timeout = 60
+
+    def create(self, request, *args, **kwargs):
+        idempotencyKey = request.headers.get('Idempotency-Key')
+        if not idempotencyKey:
+            return super().create(request, *args, **kwargs)
+
+        cache = response_cache()
+        cacheKey = f"idempotency:{type(self).__name__}:{request.user.id}:{md5(idempotencyKey.encode()).hexdigest()}"
+        if not cache.add(cacheKey, {'status': None}, self.idempotency_pending_timeout):
+            stored = cache.get(cacheKey)
+            if stored is None or stored['status'] is None:
+                raise Conflict("A request with this Idempotency-Key is in progress")
+            return Response(stored['data'], status=stored['status'])
+
+        try:
+            response = super().create(request, *args, **kwargs)
+        except Exception:
+            cache.delete(cacheKey)
+            raise
+        if status.is_success(response.status_code):
+            cache.set(cacheKey, {'data': response.data, 'status': response.status_code}, self.idempotency_timeout)
+        else:
+            cache.delete(cacheKey)
+        return response
+
+
+class ApplicationsView(IdempotentCreateMixin, generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
     lookup_field = 'opportunity__id'
     lookup_url_kwarg = 'opportunity_id'
@@ -492,8 +828,28 @@ class ApplicationsView(generics.ListCreateAPIView):
             raise Http404
 
 
-class SingleApplicationView(generics.RetrieveDestroyAPIView):
+class ApplicationsExportView(APIView):
     permission_classes = [IsAuthenticated]
+    exporters = {
+        'csv': (stream_csv, 'text/csv'),
+        'ndjson': (stream_ndjson, 'application/x-ndjson'),
+    }
+
+    def get(self, request, opportunity_id, export_format):
+        if export_format not in self.exporters:
+            raise Http404
+        opportunity = get_object_or_404(Opportunity, id = opportunity_id, user__id = request.user.id)
+        withResume = request.query_params.get('resume') in ('1', 'true')
+
+        exporter, contentType = self.exporters[export_format]
+        response = StreamingHttpResponse(exporter(opportunity, withResume), content_type=contentType)
+        response['Content-Disposition'] = f'attachment; filename="opportunity-{opportunity.id}-applications.{export_format}"'
+        return response
+
+
+class SingleApplicationView(OwnedObjectMixin, generics.RetrieveDestroyAPIView):
+    permission_classes = [IsAuthenticated]
+    queryset = Application.objects.select_related('user')
     lookup_url_kwarg = 'application_id'
 
     def get_serializer_class(self):
@@ -501,25 +857,8 @@ class SingleApplicationView(generics.RetrieveDestroyAPIView):
             return FullApplicationSerializer
         return ApplicationSerializer
 
-    def get_queryset(self):
-        applicationInstance = Application.objects.get(id = self.kwargs['application_id'])
-        opportunityId = applicationInstance.opportunity.id
-        opportunityInstance = Opportunity.objects.get(id = opportunityId)
-
-        applicationUser = applicationInstance.user.id
-        posterUser = opportunityInstance.user.id
-
-        if self.request.user.id == applicationUser or self.request.user.id == posterUser:
-            return Application.objects.filter(id = self.kwargs['application_id'])
-        else:
-            raise Http404
-
-    def destroy(self, request, *args, **kwargs):
-        applicationInstance = Application.objects.get(id = self.kwargs['application_id'])
-        applicationUser = applicationInstance.user.id
-
-        if applicationUser == self.request.user.id :
-            self.perform_destroy(Application.objects.filter(id = self.kwargs['application_id']))
-            return Response(status=204)
-        else:
-            raise Http404
\ No newline at end of file
+    def get_owner_fields(self):
+        # Applicant and poster can both read an application, only the applicant can withdraw it
+        if self.request.method == 'DELETE':
+            return ('user',)
+        return ('user', 'opportunity__user')
@@ -8,9 +8,57 @@ https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
 """
 
 import os
+from itertools import islice
 
-from django.core.asgi import get_asgi_application
+import django
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.core.handlers.asgi import ASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'volunteer.settings')
+os.environ.setdefault('ASYNC_READ_VIEWS', 'true')
 
-application = get_asgi_application()
+# Parts of a streaming response read per thread switch
+STREAMING_PARTS = 100
+
+
+def next_parts(iterator):
+    return list(islice(iterator, STREAMING_PARTS))
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """
+    Django 3.1 iterates streaming responses on the event loop, where the database reads of generators like the
+    application exports raise SynchronousOnlyOperation. Their parts are read on the request's sync thread instead,
+    the one the view ran on, which owns its connection and any server-side cursor.
+    """
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+
+        headers = [(header.encode('ascii'), value.encode('latin1')) for header, value in response.items()]
+        headers += [(b'Set-Cookie', cookie.output(header='').encode('ascii').strip())
+            for cookie in response.cookies.values()]
+        await send({'type': 'http.response.start', 'status': response.status_code, 'headers': headers})
+
+        iterator = iter(response)
+        while True:
+            parts = await sync_to_async(next_parts, thread_sensitive=True)(iterator)
+            if not parts:
+                break
+            for part in parts:
+                for chunk, last in self.chunk_bytes(part):
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body'})
+        await sync_to_async(response.close, thread_sensitive=True)()
+
+
+django.setup(set_prefix=False)
+django_application = StreamingASGIHandler()
+
+
+async def application(scope, receive, send):
+    # Django 3.1 runs the sync middleware and views of every request on one thread per process, a context per
+    # request gives each its own (Django 3.2 does this itself)
+    async with ThreadSensitiveContext():
+        await django_application(scope, receive, send)
@@ -0,0 +1,82 @@
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    Thread safe pool of raw DB-API connections shared by the threads of one worker process.
+    At most `size` connections are handed out at once, further callers wait up to `timeout` seconds.
+    Connections older than `max_age` seconds (None for no limit) are closed instead of reused.
+    """
+
+    def __init__(self, size, timeout=10, max_age=None):
+        self.size = size
+        self.timeout = timeout
+        self.max_age = max_age
+        self.opened = 0
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._idle = deque()
+        self._openedAt = {}
+
+    def get(self, connect, validate=None):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(f"No database connection available after {self.timeout}s (pool size {self.size})")
+        try:
+            while True:
+                with self._lock:
+                    # Most recently returned first, idle connections beyond demand then age out
+                    connection = self._idle.pop() if self._idle else None
+                if connection is None:
+                    connection = connect()
+                    with self._lock:
+                        self._openedAt[connection] = time.monotonic()
+                        self.opened += 1
+                    return connection
+                if self._expired(connection) or (validate is not None and not validate(connection)):
+                    self._discard(connection)
+                    continue
+                return connection
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def put(self, connection, reusable=True):
+        try:
+            if reusable and not self._expired(connection):
+                with self._lock:
+                    self._idle.append(connection)
+            else:
+                self._discard(connection)
+        finally:
+            self._slots.release()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for connection in idle:
+            self._discard(connection)
+
+    def stats(self):
+        with self._lock:
+            return {'size': self.size, 'idle': len(self._idle), 'open': len(self._openedAt), 'opened': self.opened}
+
+    def _expired(self, connection):
+        if self.max_age is None:
+            return False
+        with self._lock:
+            openedAt = self._openedAt.get(connection)
+        return openedAt is None or time.monotonic() - openedAt >= self.max_age
+
+    def _discard(self, connection):
+        with self._lock:
+            self._openedAt.pop(connection, None)
+        try:
+            connection.close()
+        except Exception:
+            pass
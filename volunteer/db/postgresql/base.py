@@ -0,0 +1,100 @@
+import threading
+
+from django.db.backends.postgresql import base
+from psycopg2 import OperationalError
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+from volunteer.db.pool import ConnectionPool, PoolTimeout
+
+_pools = {}
+_poolsLock = threading.Lock()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL backend adding connection health checks and an optional in-process pool.
+
+    CONN_HEALTH_CHECKS: before the first query of a request a persistent connection is pinged and
+    replaced if the server dropped it (the Django 4.1 setting of the same name, backported).
+    POOL: {'SIZE', 'TIMEOUT', 'MAX_AGE'}, connections closed at the end of a request go back to a pool
+    shared by all threads of the process instead of being closed, so threaded workers need fewer
+    server connections than threads. Use with CONN_MAX_AGE = 0.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_done = False
+
+    @property
+    def health_check_enabled(self):
+        return self.settings_dict.get('CONN_HEALTH_CHECKS', False)
+
+    @property
+    def pool(self):
+        options = self.settings_dict.get('POOL')
+        if not options:
+            return None
+        with _poolsLock:
+            if self.alias not in _pools:
+                _pools[self.alias] = ConnectionPool(
+                    options['SIZE'], timeout=options.get('TIMEOUT', 10), max_age=options.get('MAX_AGE'))
+            return _pools[self.alias]
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        try:
+            connection = pool.get(
+                lambda: super(DatabaseWrapper, self).get_new_connection(conn_params),
+                self._ping if self.health_check_enabled else None)
+        except PoolTimeout as e:
+            raise OperationalError(str(e)) from e
+        # The connection may have been opened by another thread's wrapper
+        self.isolation_level = self.settings_dict['OPTIONS'].get('isolation_level', connection.isolation_level)
+        return connection
+
+    def _close(self):
+        pool = self.pool
+        if pool is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            pool.put(self.connection, reusable=self._reset())
+
+    def _reset(self):
+        if self.connection.closed:
+            return False
+        if self.errors_occurred and not self.is_usable():
+            return False
+        if self.connection.info.transaction_status != TRANSACTION_STATUS_IDLE:
+            self.connection.rollback()
+        return True
+
+    def _ping(self, connection):
+        if connection.closed:
+            return False
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except base.Database.Error:
+            return False
+        return True
+
+    def connect(self):
+        super().connect()
+        self.health_check_done = True
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def close_if_health_check_failed(self):
+        if self.connection is None or not self.health_check_enabled or self.health_check_done:
+            return
+        if not self.is_usable():
+            self.close()
+        self.health_check_done = True
+
+    def _cursor(self, name=None):
+        self.close_if_health_check_failed()
+        return super()._cursor(name)
@@ -1,6 +1,7 @@
 from pathlib import Path
 
 import environ
+from django.core.exceptions import ImproperlyConfigured
 
 env = environ.Env(
     DEBUG=(bool, False)
@@ -32,11 +33,27 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.ClaimsJWTAuthentication',
     )
 }
 
+# FAST_JSON renders and parses API JSON with orjson (same output as DRF's renderer), the stdlib is used without it
+if env.bool('FAST_JSON', default=True):
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = (
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    )
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'] = (
+        'api.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    )
+
+# FAST_LIST_SERIALIZERS serializes public list endpoints from values() rows instead of model instances (same JSON)
+FAST_LIST_SERIALIZERS = env.bool('FAST_LIST_SERIALIZERS', default=True)
+
 MIDDLEWARE = [
+    'api.metrics.RequestMetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -51,6 +68,12 @@ MIDDLEWARE = [
 
 CORS_ALLOWED_ORIGINS = env.list("CORS_ALLOWED_ORIGINS")
 
+# Request metrics, see api/metrics.py. Requests running more than QUERY_BUDGET queries are logged (0 disables),
+# the Prometheus endpoint /api/metrics is only served when METRICS_TOKEN is set
+SERVER_TIMING = env.bool('SERVER_TIMING', default=True)
+QUERY_BUDGET = env.int('QUERY_BUDGET', default=20)
+METRICS_TOKEN = env.str('METRICS_TOKEN', default='')
+
 ROOT_URLCONF = 'volunteer.urls'
 
 TEMPLATES = [
@@ -71,10 +94,33 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'volunteer.wsgi.application'
 
+# Set by volunteer/asgi.py, hot read endpoints then run in a thread pool (sized by ASGI_THREADS), see api.views.read_view
+ASYNC_READ_VIEWS = env.bool('ASYNC_READ_VIEWS', default=False)
+
 if env.str('DATABASE_URL', default=''):
     DATABASES = {
         'default': env.db(),
     }
+    # DB_CONN_MAX_AGE keeps each thread's connection open across requests (seconds, 0 closes it after every request)
+    # DB_POOL_SIZE > 0 instead shares a pool of connections between the threads of a worker (gunicorn --threads),
+    # it should be at least the thread count, connections are then recycled after DB_CONN_MAX_AGE
+    # DB_TRANSACTION_POOLER is for pgbouncer in transaction mode: no server side cursors, which need the session,
+    # and the database/pgbouncer TimeZone must be UTC so no SET TIME ZONE is issued per connection
+    if DATABASES['default']['ENGINE'].startswith('django.db.backends.postgresql'):
+        DATABASES['default']['ENGINE'] = 'volunteer.db.postgresql'
+    DB_CONN_MAX_AGE = env.int('DB_CONN_MAX_AGE', default=600)
+    DB_POOL_SIZE = env.int('DB_POOL_SIZE', default=0)
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': 0 if DB_POOL_SIZE else DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': env.bool('DB_CONN_HEALTH_CHECKS', default=True),
+        'DISABLE_SERVER_SIDE_CURSORS': env.bool('DB_TRANSACTION_POOLER', default=False),
+    })
+    if DB_POOL_SIZE:
+        DATABASES['default']['POOL'] = {
+            'SIZE': DB_POOL_SIZE,
+            'TIMEOUT': env.int('DB_POOL_TIMEOUT', default=10),
+            'MAX_AGE': DB_CONN_MAX_AGE or None,
+        }
 else:
     DATABASES = {
         'default': {
@@ -83,6 +129,51 @@ else:
         }
     }
 
+# DATABASE_REPLICA_URLS, comma separated read replicas of the default database, see api/replicas.py
+# REPLICA_PIN_SECONDS is how long a user's reads stay on the primary after they wrote, it should exceed replica lag
+REPLICA_DATABASES = []
+for url in env.list('DATABASE_REPLICA_URLS', default=[]):
+    replica = env.db_url_config(url)
+    if replica['ENGINE'].startswith('django.db.backends.postgresql'):
+        replica['ENGINE'] = 'volunteer.db.postgresql'
+    for key in ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS', 'DISABLE_SERVER_SIDE_CURSORS', 'POOL'):
+        if key in DATABASES['default']:
+            replica[key] = DATABASES['default'][key]
+    replica['TEST'] = {'MIRROR': 'default'}
+    REPLICA_DATABASES.append(f'replica{len(REPLICA_DATABASES) + 1}')
+    DATABASES[REPLICA_DATABASES[-1]] = replica
+
+if REPLICA_DATABASES:
+    DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+    MIDDLEWARE.append('api.replicas.ReplicaRoutingMiddleware')
+
+REPLICA_PIN_SECONDS = env.int('REPLICA_PIN_SECONDS', default=10)
+
+# CACHE_URL e.g. locmemcache://, filecache:///var/tmp/volunteer, pymemcache://127.0.0.1:11211
+# CACHE_SHARED, whether all workers use the same cache, true unless it's a per-process local memory cache
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+CACHE_SHARED = env.bool('CACHE_SHARED', default=CACHES['default']['BACKEND'] not in (
+    'django.core.cache.backends.locmem.LocMemCache', 'django.core.cache.backends.dummy.DummyCache'))
+
+# Response cache for anonymous reads, see api/caching.py. Off by default without a shared cache
+RESPONSE_CACHE_ALIAS = 'default'
+RESPONSE_CACHE_TIMEOUT = env.int('RESPONSE_CACHE_TIMEOUT', default=300 if CACHE_SHARED else 0)
+
+# Read-your-writes pins are kept in the cache, a worker that can't see them would read stale rows from a replica
+if REPLICA_DATABASES and not CACHE_SHARED:
+    raise ImproperlyConfigured("DATABASE_REPLICA_URLS needs a cache shared by all workers (CACHE_URL, CACHE_SHARED)")
+
+# request.user is built from the token claims, views needing more than the id load the User from the default cache.
+# Off by default without a shared cache, where other workers would keep a deactivated or demoted user
+AUTH_USER_CACHE_TIMEOUT = env.int('AUTH_USER_CACHE_TIMEOUT', default=60 if CACHE_SHARED else 0)
+
+# Background jobs, see api/jobs.py. Jobs running longer than JOB_TIMEOUT seconds are assumed lost and retried
+JOB_TIMEOUT = env.int('JOB_TIMEOUT', default=600)
+JOB_RETRY_DELAY = env.int('JOB_RETRY_DELAY', default=10)
+JOB_RETENTION_DAYS = env.int('JOB_RETENTION_DAYS', default=7)
+
 AUTH_USER_MODEL = "api.User"
 
 AUTH_PASSWORD_VALIDATORS = [